@@ -0,0 +1,84 @@
+import org.apache.spark.sql.{DataFrame, SparkSession}
+import org.apache.spark.sql.functions._
+
+// Compares the edge modes of FastEntityMapper on synthetic, consolidation
+// heavy transactions: number of edges, time to build them, time of the whole
+// entity mapping, and checks that every mode finds the same entities.
+//
+// Arguments (all optional): number of transactions, fraction of
+// consolidation transactions, maximum inputs of a consolidation, number of
+// distinct public keys, modes to run (comma separated).
+object EdgeModeBenchmark {
+  // Ordinary transactions have 2 to 4 inputs, consolidations up to
+  // maxInputs, keys are drawn at random from numKeys so entities merge
+  def syntheticTxins(
+      spark: SparkSession,
+      numTxs: Long,
+      consolidationFraction: Double,
+      maxInputs: Int,
+      numKeys: Long): DataFrame = {
+    import spark.implicits._
+
+    spark.range(numTxs)
+      .withColumnRenamed("id", "tx_id")
+      .withColumn(
+        "n_inputs",
+        when(rand(1) < consolidationFraction, floor(rand(2) * (maxInputs - 99)) + 100)
+          .otherwise(floor(rand(3) * 3) + 2)
+          .cast("int")
+      )
+      .withColumn("input", explode(sequence(lit(1), $"n_inputs")))
+      .withColumn("public_key_uuid", concat(lit("pk-"), floor(rand(4) * numKeys).cast("string")))
+      .select("tx_id", "public_key_uuid")
+  }
+
+  private def timed[T](block: => T): (T, Double) = {
+    val start = System.nanoTime()
+    val result = block
+    (result, (System.nanoTime() - start) / 1e9)
+  }
+
+  def main(args: Array[String]): Unit = {
+    val numTxs = if (args.length > 0) args(0).toLong else 200000L
+    val consolidationFraction = if (args.length > 1) args(1).toDouble else 0.002
+    val maxInputs = if (args.length > 2) args(2).toInt else 500
+    val numKeys = if (args.length > 3) args(3).toLong else 400000L
+    val modes = if (args.length > 4) args(4).split(",").toSeq else FastEntityMapper.EdgeModes
+
+    // spark-submit sets the master, sbt runMain runs locally
+    val builder = SparkSession.builder.appName("EdgeModeBenchmark")
+    val spark =
+      (if (sys.props.contains("spark.master")) builder else builder.master("local[*]")).getOrCreate()
+    spark.sparkContext.setCheckpointDir("/tmp/spark-checkpoint")
+
+    val txinsDF = syntheticTxins(spark, numTxs, consolidationFraction, maxInputs, numKeys).cache()
+    val numRows = txinsDF.count()
+    println(f"$numTxs%d transactions, $numRows%d (transaction, public key) rows, " +
+      f"${consolidationFraction * 100}%.2f%% consolidations of up to $maxInputs%d inputs")
+
+    var reference: Option[(String, DataFrame)] = None
+    println(f"${"mode"}%-6s ${"edges"}%14s ${"edges (s)"}%10s ${"mapping (s)"}%12s ${"entities"}%10s")
+    for (mode <- modes) {
+      val (numEdges, edgesSeconds) = timed(FastEntityMapper.transactionEdges(txinsDF, mode).count())
+      val (mapping, mappingSeconds) = timed(FastEntityMapper.entityMapping(txinsDF, mode).cache())
+      // entityMapping runs the connected components, the count maps them back
+      val (numEntities, countSeconds) = timed(mapping.select("entity_id").distinct().count())
+      println(f"$mode%-6s $numEdges%14d $edgesSeconds%10.1f ${mappingSeconds + countSeconds}%12.1f $numEntities%10d")
+
+      reference match {
+        case None => reference = Some((mode, mapping))
+        case Some((referenceMode, referenceMapping)) =>
+          // Same entities: the entity ids of both modes map one to one
+          val pairs = referenceMapping.withColumnRenamed("entity_id", "reference_id")
+            .join(mapping, "public_key_uuid")
+            .select("reference_id", "entity_id")
+            .distinct()
+            .count()
+          val same = pairs == numEntities && pairs == referenceMapping.select("entity_id").distinct().count()
+          println(s"  same entities as $referenceMode: $same")
+      }
+    }
+
+    spark.stop()
+  }
+}
@@ -1,53 +1,63 @@
-import org.apache.spark.sql.SparkSession
+import org.apache.spark.sql.{DataFrame, SparkSession}
 import org.apache.spark.sql.functions._
 import org.apache.spark.graphx._
 import org.apache.spark.rdd.RDD
 
 object FastEntityMapper {
-  def main(args: Array[String]): Unit = {
-    // Initialize Spark session
-    val spark = SparkSession.builder.appName("SnowflakeConnector").getOrCreate()
+  // How the public keys of a transaction are linked. "star" links every key
+  // to the smallest one and "chain" links consecutive keys: m - 1 edges for
+  // m keys. "pairs" links all m * (m - 1) / 2 pairs. All give the same
+  // connected components, so the same entities.
+  val EdgeModes = Seq("star", "chain", "pairs")
 
-    // Import implicits
+  // Edges (src < dst) between public keys that co-occur in the same transaction
+  def transactionEdges(txinsDF: DataFrame, edgeMode: String): DataFrame = {
+    val spark = txinsDF.sparkSession
     import spark.implicits._
 
-    // Set checkpoint directory
-    spark.sparkContext.setCheckpointDir("/tmp/spark-checkpoint")
+    // Group by transaction and collect public keys as a sorted set, so the
+    // star center and the chain order do not depend on the input order
+    val txPublicKeysDF = txinsDF
+      .groupBy("tx_id")
+      .agg(array_sort(collect_set("public_key_uuid")).as("public_keys"))
+      .filter(size($"public_keys") > 1)
 
-    // Snowflake connection options
-    val snowflakeOptions = Map(
-      "sfURL" -> sys.env("SNOWFLAKE_URL"),
-      "sfUser" -> sys.env("SNOWFLAKE_USER"),
-      "sfPassword" -> sys.env("SNOWFLAKE_PASSWORD"),
-      "sfDatabase" -> "warehouse",
-      "sfSchema" -> "shared_sandbox",
-      "sfWarehouse" -> sys.env("SNOWFLAKE_WAREHOUSE"),
-      "sfRole" -> sys.env("SNOWFLAKE_ROLE"),
-      "sfSSL" -> "on"
-    )
+    val publicKeyPairsDF = edgeMode match {
+      case "star" =>
+        txPublicKeysDF
+          .select(
+            element_at($"public_keys", 1).as("src"),
+            explode(expr("slice(public_keys, 2, size(public_keys) - 1)")).as("dst")
+          )
+      case "chain" =>
+        txPublicKeysDF
+          .select(explode(expr(
+            "transform(sequence(1, size(public_keys) - 1), " +
+              "i -> named_struct('src', public_keys[i - 1], 'dst', public_keys[i]))"
+          )).as("edge"))
+          .select($"edge.src".as("src"), $"edge.dst".as("dst"))
+      case "pairs" =>
+        txPublicKeysDF
+          .withColumn("public_key", explode($"public_keys"))
+          .withColumn("public_key_others", array_except($"public_keys", array($"public_key")))
+          .withColumn("public_key_other", explode($"public_key_others"))
+          .select($"public_key".as("src"), $"public_key_other".as("dst"))
+          .filter($"src" < $"dst") // Avoid duplicate pairs and self-pairs
+      case other =>
+        throw new IllegalArgumentException(
+          s"Unknown edge mode '$other', expected one of ${EdgeModes.mkString(", ")}")
+    }
 
-    // Read data from Snowflake into a Spark DataFrame and change to lowercase
-    val txinsDF = spark.read
-      .format("snowflake")
-      .options(snowflakeOptions)
-      .option("dbtable", "warehouse.shared_sandbox.input_address_pairs_50")
-      .load()
-      .withColumnRenamed("TX_ID", "tx_id")
-      .withColumnRenamed("PUBLIC_KEY_UUID", "public_key_uuid")
+    // Keys co-occurring in several transactions would repeat edges
+    publicKeyPairsDF.distinct()
+  }
 
-    // Group by transaction and collect public keys as a set
-    val txPublicKeysDF = txinsDF
-      .groupBy("tx_id")
-      .agg(collect_set("public_key_uuid").as("public_keys"))
-
-    // Generate edges between public keys that co-occur in the same transaction
-    val publicKeyPairsDF = txPublicKeysDF
-      .withColumn("public_key", explode($"public_keys"))
-      .withColumn("public_key_others", array_except($"public_keys", array($"public_key")))
-      .withColumn("public_key_other", explode($"public_key_others"))
-      .select($"public_key".as("src"), $"public_key_other".as("dst"))
-      .filter($"src" < $"dst") // Avoid duplicate pairs and self-pairs
-      .distinct()
+  // Connected components of the public keys, as (public_key_uuid, entity_id)
+  def entityMapping(txinsDF: DataFrame, edgeMode: String): DataFrame = {
+    val spark = txinsDF.sparkSession
+    import spark.implicits._
+
+    val publicKeyPairsDF = transactionEdges(txinsDF, edgeMode)
 
     // Create vertices RDD
     val vertices: RDD[(VertexId, String)] = txinsDF
@@ -77,9 +87,41 @@ object FastEntityMapper {
     val cc = graph.connectedComponents().vertices
 
     // Map back the vertex IDs to public_key_uuid
-    val ccMapped = cc.join(vertices).map {
+    cc.join(vertices).map {
       case (id, (ccId, publicKey)) => (publicKey, ccId)
     }.toDF("public_key_uuid", "entity_id")
+  }
+
+  def main(args: Array[String]): Unit = {
+    // Initialize Spark session
+    val spark = SparkSession.builder.appName("SnowflakeConnector").getOrCreate()
+
+    // Set checkpoint directory
+    spark.sparkContext.setCheckpointDir("/tmp/spark-checkpoint")
+
+    // Snowflake connection options
+    val snowflakeOptions = Map(
+      "sfURL" -> sys.env("SNOWFLAKE_URL"),
+      "sfUser" -> sys.env("SNOWFLAKE_USER"),
+      "sfPassword" -> sys.env("SNOWFLAKE_PASSWORD"),
+      "sfDatabase" -> "warehouse",
+      "sfSchema" -> "shared_sandbox",
+      "sfWarehouse" -> sys.env("SNOWFLAKE_WAREHOUSE"),
+      "sfRole" -> sys.env("SNOWFLAKE_ROLE"),
+      "sfSSL" -> "on"
+    )
+    val edgeMode = sys.env.getOrElse("EDGE_MODE", "star")
+
+    // Read data from Snowflake into a Spark DataFrame and change to lowercase
+    val txinsDF = spark.read
+      .format("snowflake")
+      .options(snowflakeOptions)
+      .option("dbtable", "warehouse.shared_sandbox.input_address_pairs_50")
+      .load()
+      .withColumnRenamed("TX_ID", "tx_id")
+      .withColumnRenamed("PUBLIC_KEY_UUID", "public_key_uuid")
+
+    val ccMapped = entityMapping(txinsDF, edgeMode)
 
     // Write the entity mapping DataFrame to Snowflake
     ccMapped.write
@@ -90,9 +132,8 @@ object FastEntityMapper {
       .save()
 
     //verifyDF.show()
-    
+
     // Stop Spark session
     spark.stop()
   }
 }
-
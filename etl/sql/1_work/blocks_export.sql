@@ -0,0 +1,31 @@
+-- Columns of the block analytics of python_ml (bitcoin_app/blocks.py), one
+-- CSV per query in dataset/blocks/: blocks.csv, txs.csv and txouts.csv.
+-- Fees are derived from the coinbase outputs, so only coinbase transactions
+-- (tx_n = 0) and their outputs are exported.
+
+-- blocks.csv
+select block_id
+, height
+, date_part(epoch_second, time_utc) as time
+, virt_size
+from warehouse.stnd.blocks
+order by height
+;
+
+-- txs.csv
+select tx_id
+, block_id
+, tx_n
+, virt_size
+from warehouse.stnd.txs
+where tx_n = 0
+;
+
+-- txouts.csv
+select o.tx_id
+, o.amount_sats
+from warehouse.stnd.txouts o
+inner join warehouse.stnd.txs t
+    on t.tx_id = o.tx_id
+where t.tx_n = 0
+;
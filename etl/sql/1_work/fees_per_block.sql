@@ -1,25 +1,39 @@
+-- Block subsidy: 50 BTC halved every 210,000 blocks (zero after 64 halvings),
+-- so fees stay right across halvings, e.g. 3.125 BTC from height 840,000.
+-- python_ml/bitcoin_app/blocks.py computes the same metrics over all heights
+-- from the export of blocks_export.sql.
 with fourth_epoch_blocks as (
-    select *
+    select
+          block_id
+        , height
+        , virt_size
+        , case
+            when floor(height / 210000) >= 64 then 0
+            else floor(5000000000 / power(2, floor(height / 210000)))
+          end as subsidy_sats
     from warehouse.stnd.blocks
     where height >= 630000
 )
 
 ,  fourth_epoch_coinbase_txs as (
     select
-          tx_id
-        , block_id
-        , virt_size
-    from warehouse.stnd.txs
-    where tx_n = 0
-        and block_id >= 630001
+          txs.tx_id
+        , txs.block_id
+        , txs.virt_size
+    from warehouse.stnd.txs txs
+    inner join fourth_epoch_blocks b
+        on txs.block_id = b.block_id
+    where txs.tx_n = 0
 )
 
 , coinbase_aggregates as (
     select
           txs.tx_id
         , txs.block_id
+        , max(b.height) as height
         , max(txs.virt_size) as virt_size
         , max(b.virt_size) as block_virt_size
+        , max(b.subsidy_sats) as subsidy_sats
         , sum(txo.amount_sats) as total_coinbase_sats
         , sum(txo.amount_btc) as total_coinbase_btc
     from fourth_epoch_coinbase_txs txs
@@ -33,17 +47,19 @@ with fourth_epoch_blocks as (
 , final as (
     select
           block_id
+        , height
         , tx_id
         , virt_size
         , block_virt_size
         , block_virt_size - virt_size as txs_virt_size
         , total_coinbase_sats
         , total_coinbase_btc
-        , total_coinbase_sats - 625000000 as total_fees_sats
-        , total_coinbase_btc - 6.25 as total_fees_btc
+        , subsidy_sats
+        , total_coinbase_sats - subsidy_sats as total_fees_sats
+        , total_coinbase_btc - subsidy_sats / 1e8 as total_fees_btc
         , total_fees_sats / txs_virt_size as sats_per_vbyte
     from coinbase_aggregates
-    order by block_id
+    order by height
 )
 
 select * from final
@@ -12,7 +12,6 @@ with multi_input_txins as (
     inner join warehouse.shared_sandbox.txouts o
         on o.tx_id = i.prevout_tx_id
         and o.tx_n = i.prev_tx_n
-    order by i.tx_id
 )
 
 select * from final
@@ -0,0 +1,96 @@
+-- Entity features partitioned by block height bucket.
+-- Buckets are 2016 blocks (one difficulty epoch): bucket b holds heights
+-- [b * 2016, (b + 1) * 2016), e.g. the 840,000 halving falls in bucket 416.
+-- Windows are summed from these partitions (B_entity_features_window.sql)
+-- instead of rescanning transactions.
+set bucket_size = 2016;
+
+create or replace table warehouse.shared_sandbox.entity_features_by_height as (
+with blocks as (
+    select block_id
+    , floor(height / $bucket_size) as height_bucket
+    from warehouse.stnd.blocks
+)
+
+-- Outputs received by the entity, at the height of the receiving transaction
+, received as (
+    select m.entity_id
+    , b.height_bucket
+    , o.public_key_uuid
+    , o.tx_id
+    , o.amount_btc
+    from warehouse.core.txouts o
+    inner join warehouse.shared_sandbox.entity_mapping_50 m
+        on m.public_key_uuid = o.public_key_uuid
+    inner join warehouse.stnd.txs t
+        on t.tx_id = o.tx_id
+    inner join blocks b
+        on b.block_id = t.block_id
+)
+
+-- Outputs spent by the entity, at the height of the spending transaction
+, spent as (
+    select m.entity_id
+    , b.height_bucket
+    , o.public_key_uuid
+    , i.tx_id
+    , o.amount_btc
+    from warehouse.stnd.txins i
+    inner join warehouse.core.txouts o
+        on o.tx_id = i.prevout_tx_id
+        and o.tx_n = i.prev_tx_n
+    inner join warehouse.shared_sandbox.entity_mapping_50 m
+        on m.public_key_uuid = o.public_key_uuid
+    inner join warehouse.stnd.txs t
+        on t.tx_id = i.tx_id
+    inner join blocks b
+        on b.block_id = t.block_id
+)
+
+-- A transaction belongs to one block, so transaction counts and amounts
+-- add up across buckets. Distinct addresses do not (an address active in
+-- two buckets is counted in both), so a mergeable HyperLogLog state is
+-- kept next to the exact per-bucket count.
+, received_by_bucket as (
+    select entity_id
+    , height_bucket
+    , count(distinct public_key_uuid) as receive_addresses
+    , hll_export(hll_accumulate(public_key_uuid)) as receive_addresses_hll
+    , count(distinct tx_id) as receive_transactions
+    , sum(amount_btc) as btc_received
+    from received
+    group by entity_id, height_bucket
+)
+
+, spent_by_bucket as (
+    select entity_id
+    , height_bucket
+    , count(distinct public_key_uuid) as spend_addresses
+    , hll_export(hll_accumulate(public_key_uuid)) as spend_addresses_hll
+    , count(distinct tx_id) as spend_transactions
+    , sum(amount_btc) as btc_spent
+    from spent
+    group by entity_id, height_bucket
+)
+
+, final as (
+    select coalesce(r.entity_id, s.entity_id) as entity_id
+    , coalesce(r.height_bucket, s.height_bucket) as height_bucket
+    , coalesce(r.receive_addresses, 0) as receive_addresses
+    , r.receive_addresses_hll
+    , coalesce(r.receive_transactions, 0) as receive_transactions
+    , coalesce(r.btc_received, 0) as btc_received
+    , coalesce(s.spend_addresses, 0) as spend_addresses
+    , s.spend_addresses_hll
+    , coalesce(s.spend_transactions, 0) as spend_transactions
+    , coalesce(s.btc_spent, 0) as btc_spent
+    from received_by_bucket r
+    full outer join spent_by_bucket s
+        on s.entity_id = r.entity_id
+        and s.height_bucket = r.height_bucket
+)
+
+select * from final
+order by height_bucket, entity_id
+)
+;
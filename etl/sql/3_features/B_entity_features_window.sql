@@ -0,0 +1,23 @@
+-- Entity features over the block height window [window_start, window_end),
+-- e.g. since the 840,000 halving or the last N blocks, summed from the
+-- per-bucket partitions. Buckets overlapping the window are included, so
+-- bounds are rounded outward to multiples of bucket_size.
+-- Address counts merge the HyperLogLog states (about 1.6% error).
+-- Columns match the lifetime features read by python_ml.
+set bucket_size = 2016;
+set window_start = 840000;
+set window_end = 100000000;
+
+select entity_id
+, coalesce(round(hll_estimate(hll_combine(hll_import(receive_addresses_hll)))), 0) as total_recieve_addresses
+, sum(receive_transactions) as total_recieve_transactions
+, sum(btc_received) as total_btc_received
+, coalesce(round(hll_estimate(hll_combine(hll_import(spend_addresses_hll)))), 0) as total_spend_addresses
+, sum(spend_transactions) as total_spend_transactions
+, sum(btc_spent) as total_btc_spent
+from warehouse.shared_sandbox.entity_features_by_height
+where height_bucket >= floor($window_start / $bucket_size)
+    and height_bucket < ceil($window_end / $bucket_size)
+group by entity_id
+order by entity_id
+;
@@ -0,0 +1,15 @@
+-- Per-bucket features exported for python_ml (entity_features_by_height.csv),
+-- which sums the buckets of a window itself. Per-bucket address counts are
+-- exact, but their sum over several buckets is an upper bound of the
+-- distinct addresses in the window.
+select entity_id
+, height_bucket
+, receive_addresses as total_recieve_addresses
+, receive_transactions as total_recieve_transactions
+, btc_received as total_btc_received
+, spend_addresses as total_spend_addresses
+, spend_transactions as total_spend_transactions
+, btc_spent as total_btc_spent
+from warehouse.shared_sandbox.entity_features_by_height
+order by height_bucket, entity_id
+;
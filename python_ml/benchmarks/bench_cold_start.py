@@ -0,0 +1,56 @@
+"""Cold-start benchmark of the bitcoin_app CLI and modules.
+
+Each case runs in a fresh interpreter, so the measured time includes the
+interpreter start and all imports. Run from the `python_ml` folder:
+
+    python benchmarks/bench_cold_start.py --repeat 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+CASES = {
+    'python (baseline)': ['-c', 'pass'],
+    'bitcoin_app --help': ['-m', 'bitcoin_app', '--help'],
+    'import bitcoin_app.cli': ['-c', 'import bitcoin_app.cli'],
+    'import bitcoin_app.settings': ['-c', 'import bitcoin_app.settings'],
+    'import bitcoin_app.data_load': ['-c', 'import bitcoin_app.data_load'],
+    'import bitcoin_app.data_processing': ['-c', 'import bitcoin_app.data_processing'],
+    'import bitcoin_app.clustering': ['-c', 'import bitcoin_app.clustering'],
+}
+
+
+def run_case(args: list[str], repeat: int) -> list[float]:
+    """Return the wall times of `repeat` runs of the interpreter with `args`."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'{"case":<40}{"median [ms]":>12}{"min [ms]":>12}')
+    for name, case_args in CASES.items():
+        times = run_case(case_args, args.repeat)
+        print(
+            f'{name:<40}'
+            f'{statistics.median(times) * 1e3:>12.1f}'
+            f'{min(times) * 1e3:>12.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
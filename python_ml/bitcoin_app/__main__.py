@@ -0,0 +1,4 @@
+"""Entry point for `python -m bitcoin_app`."""
+from bitcoin_app.cli import main
+
+main()
@@ -0,0 +1,253 @@
+"""Block level analytics: fees, fee rates and block intervals.
+
+Computed with NumPy over columnar arrays, one `.npy` file per column:
+
+- `blocks/`: block_id, height, time (unix seconds), virt_size
+- `txs/`: tx_id, block_id, tx_n, virt_size
+- `txouts/`: tx_id, amount_sats
+
+Fees are the coinbase outputs minus the block subsidy, so only the
+coinbase transactions (tx_n == 0) and their outputs are needed; other
+rows are ignored.
+"""
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    'blocks': ['block_id', 'height', 'time', 'virt_size'],
+    'txs': ['tx_id', 'block_id', 'tx_n', 'virt_size'],
+    'txouts': ['tx_id', 'amount_sats'],
+}
+
+INITIAL_SUBSIDY_SATS = 5000000000
+HALVING_INTERVAL = 210000
+
+
+def subsidy_sats(height: np.ndarray) -> np.ndarray:
+    """Block subsidy in satoshis at the given heights.
+
+    The subsidy starts at 50 BTC and is halved (right shift) every 210,000
+    blocks; it is zero after 64 halvings.
+
+    :param height: block heights.
+    :type height: numpy.ndarray
+
+    :return: subsidies in satoshis
+    :rtype: numpy.ndarray
+    """
+    halvings = np.asarray(height, dtype=np.int64) // HALVING_INTERVAL
+    return np.where(
+        halvings >= 64,
+        0,
+        np.right_shift(INITIAL_SUBSIDY_SATS, np.minimum(halvings, 63)),
+    )
+
+
+def load_columns(folder: Path, table: str, chunk_size: int = 5000000) -> dict:
+    """Load the columns of a table, memory-mapped.
+
+    If the `.npy` columns do not exist yet, they are written once from
+    `<table>.csv` in the same folder (e.g. a warehouse export).
+
+    :param folder: folder of the tables.
+    :type folder: Path
+    :param table: 'blocks', 'txs' or 'txouts'.
+    :type table: str
+    :param chunk_size: number of CSV rows read at once.
+    :type chunk_size: int
+
+    :return: arrays by column
+    :rtype: dict
+    """
+    folder = Path(folder)
+    columns = COLUMNS[table]
+    table_dir = folder / table
+    if not all((table_dir / f'{col}.npy').exists() for col in columns):
+        _csv_to_columns(folder / f'{table}.csv', table_dir, columns, chunk_size)
+
+    return {
+        col: np.load(table_dir / f'{col}.npy', mmap_mode='r')
+        for col in columns
+    }
+
+
+def _csv_to_columns(csv_path, table_dir, columns, chunk_size):
+    logger.info('Converting %s to columns in %s', csv_path, table_dir)
+    chunks = []
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        chunk.columns = [col.lower() for col in chunk.columns]
+        chunks.append(chunk[columns].to_numpy(dtype=np.int64))
+    values = np.concatenate(chunks)
+
+    table_dir.mkdir(parents=True, exist_ok=True)
+    for i, col in enumerate(columns):
+        np.save(table_dir / f'{col}.npy', np.ascontiguousarray(values[:, i]))
+
+
+def _lookup(keys: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Rows of `keys` holding each of `values`, and which values were found."""
+    if not len(keys):
+        return np.zeros(len(values), np.int64), np.zeros(len(values), bool)
+    sorter = np.argsort(keys, kind='stable')
+    # Searching a sorted copy is much faster than searchsorted(sorter=...),
+    # which gathers through the permutation at every step
+    sorted_keys = keys[sorter]
+    i = np.minimum(np.searchsorted(sorted_keys, values), len(keys) - 1)
+    return sorter[i], sorted_keys[i] == values
+
+
+def block_metrics(blocks: dict, txs: dict, txouts: dict) -> pd.DataFrame:
+    """Fees, fee rate and interval of every block, ordered by height.
+
+    :param blocks: block columns.
+    :type blocks: dict
+    :param txs: transaction columns, at least the coinbase transactions.
+    :type txs: dict
+    :param txouts: output columns, at least the coinbase outputs.
+    :type txouts: dict
+
+    :return: one row per block
+    :rtype: pandas.DataFrame
+    """
+    order = np.argsort(blocks['height'], kind='stable')
+    block_id = np.asarray(blocks['block_id'])[order]
+    height = np.asarray(blocks['height'])[order]
+    time = np.asarray(blocks['time'])[order]
+    block_vsize = np.asarray(blocks['virt_size'])[order]
+    n_blocks = len(block_id)
+
+    # Coinbase transaction of every block
+    coinbase = np.asarray(txs['tx_n']) == 0
+    cb_tx_id = np.asarray(txs['tx_id'])[coinbase]
+    cb_block, cb_found = _lookup(block_id, np.asarray(txs['block_id'])[coinbase])
+    cb_tx_id, cb_block = cb_tx_id[cb_found], cb_block[cb_found]
+    cb_vsize = np.asarray(txs['virt_size'])[coinbase][cb_found]
+
+    # Coinbase outputs summed per block
+    out_tx, out_found = _lookup(cb_tx_id, np.asarray(txouts['tx_id']))
+    coinbase_sats = np.bincount(
+        cb_block[out_tx[out_found]],
+        weights=np.asarray(txouts['amount_sats'])[out_found],
+        minlength=n_blocks,
+    ).round().astype(np.int64)
+
+    has_coinbase = np.zeros(n_blocks, dtype=bool)
+    has_coinbase[cb_block] = True
+    coinbase_vsize = np.zeros(n_blocks, dtype=np.int64)
+    coinbase_vsize[cb_block] = cb_vsize
+
+    subsidy = subsidy_sats(height)
+    fees = np.where(has_coinbase, coinbase_sats - subsidy, np.nan)
+    txs_vsize = block_vsize - coinbase_vsize
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fee_rate = np.where(txs_vsize > 0, fees / txs_vsize, np.nan)
+
+    interval = np.empty(n_blocks, dtype=np.float64)
+    interval[:1] = np.nan
+    interval[1:] = np.diff(time)
+    # Only consecutive heights have an interval
+    interval[1:][np.diff(height) != 1] = np.nan
+
+    logger.info(
+        'Metrics of %d blocks computed, %d without coinbase.',
+        n_blocks, n_blocks - int(has_coinbase.sum()),
+    )
+    return pd.DataFrame({
+        'block_id': block_id,
+        'height': height,
+        'time': time,
+        'interval_s': interval,
+        'block_vsize': block_vsize,
+        'txs_vsize': txs_vsize,
+        'coinbase_sats': np.where(has_coinbase, coinbase_sats, np.nan),
+        'subsidy_sats': subsidy,
+        'fees_sats': fees,
+        'sats_per_vbyte': fee_rate,
+    })
+
+
+def rolling_stats(
+        metrics: pd.DataFrame,
+        window: int = 144,
+        quantiles: tuple[float, ...] = (0.1, 0.5, 0.9),
+) -> pd.DataFrame:
+    """Rolling statistics over the last `window` blocks of every block.
+
+    :param metrics: output of `block_metrics`.
+    :type metrics: pandas.DataFrame
+    :param window: number of blocks, 144 is about a day.
+    :type window: int
+    :param quantiles: quantiles of the block interval.
+    :type quantiles: tuple
+
+    :return: height, rolling median fee rate and interval quantiles
+    :rtype: pandas.DataFrame
+    """
+    stats = pd.DataFrame({'height': metrics['height']})
+    stats['sats_per_vbyte_median'] = (
+        metrics['sats_per_vbyte'].rolling(window, min_periods=1).median()
+    )
+    stats['fees_sats_sum'] = metrics['fees_sats'].rolling(window, min_periods=1).sum()
+    interval = metrics['interval_s'].rolling(window, min_periods=1)
+    for q in quantiles:
+        stats[f'interval_s_p{round(q * 100)}'] = interval.quantile(q)
+    return stats
+
+
+def bucket_summary(metrics: pd.DataFrame, bucket_size: int = 2016) -> pd.DataFrame:
+    """Block statistics per height bucket.
+
+    Buckets are the ones of the entity features partitioned by height
+    (HEIGHT_BUCKET = height // bucket_size), so the summary can be joined
+    to them.
+
+    :param metrics: output of `block_metrics`.
+    :type metrics: pandas.DataFrame
+    :param bucket_size: number of blocks per bucket.
+    :type bucket_size: int
+
+    :return: one row per height bucket
+    :rtype: pandas.DataFrame
+    """
+    buckets = metrics.groupby(metrics['height'] // bucket_size)
+    summary = pd.DataFrame({
+        'blocks': buckets.size(),
+        'first_time': buckets['time'].min(),
+        'fees_sats': buckets['fees_sats'].sum(),
+        'subsidy_sats': buckets['subsidy_sats'].sum(),
+        'sats_per_vbyte_median': buckets['sats_per_vbyte'].median(),
+        'interval_s_mean': buckets['interval_s'].mean(),
+        'interval_s_median': buckets['interval_s'].median(),
+    })
+    summary.index.name = 'HEIGHT_BUCKET'
+    return summary.reset_index()
+
+
+def block_analytics(
+        folder: Path,
+        window: int = 144,
+        bucket_size: int = 2016,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Load the block, transaction and output columns and compute the metrics.
+
+    :param folder: folder of the tables.
+    :type folder: Path
+    :param window: number of blocks of the rolling statistics.
+    :type window: int
+    :param bucket_size: number of blocks per height bucket.
+    :type bucket_size: int
+
+    :return: per block metrics, rolling statistics and per bucket summary
+    :rtype: tuple
+    """
+    blocks = load_columns(folder, 'blocks')
+    txs = load_columns(folder, 'txs')
+    txouts = load_columns(folder, 'txouts')
+
+    metrics = block_metrics(blocks, txs, txouts)
+    return metrics, rolling_stats(metrics, window), bucket_summary(metrics, bucket_size)
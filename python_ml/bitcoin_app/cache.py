@@ -0,0 +1,186 @@
+"""Content-addressed on-disk cache of pipeline stage outputs."""
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from bitcoin_app.fingerprint import value_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class StageCache:
+    """Cache of stage outputs keyed by the hash of their inputs.
+
+    An entry is a folder named after its key, holding one `.npy` file per
+    array and a joblib file of the other objects (fitted estimators).
+    Arrays are loaded back memory-mapped and read-only. The modification
+    time of an entry is its last use; when the cache grows over
+    `max_bytes`, the least recently used entries are deleted.
+
+    :param root: cache folder.
+    :type root: Path
+    :param max_bytes: size limit of the cache.
+    :type max_bytes: int
+    """
+
+    OBJECTS_FILE = 'objects.joblib'
+    META_FILE = 'meta.json'
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(stage: str, upstream: str | None, settings=None) -> str:
+        """Key of a stage from the key of its input and its own settings.
+
+        :param stage: stage name.
+        :type stage: str
+        :param upstream: key of the upstream stage, or any input identity.
+        :type upstream: str
+        :param settings: JSON-serializable settings of the stage.
+
+        :return: hex digest
+        :rtype: str
+        """
+        return value_fingerprint(stage, upstream, settings)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def load(self, key: str) -> dict | None:
+        """Returns the outputs stored under `key`, None on a miss.
+
+        :param key: stage key.
+        :type key: str
+
+        :return: arrays (memory-mapped) and objects by name
+        :rtype: dict
+        """
+        from joblib import load
+
+        path = self._path(key)
+        meta_path = path / self.META_FILE
+        if not meta_path.exists():
+            return None
+
+        meta = json.loads(meta_path.read_text())
+        outputs = {
+            name: np.load(path / f'{name}.npy', mmap_mode='r')
+            for name in meta['arrays']
+        }
+        if meta['objects']:
+            outputs.update(load(path / self.OBJECTS_FILE))
+
+        # Mark as recently used
+        os.utime(path)
+        logger.info('Stage %s loaded from the cache.', meta['stage'])
+        return outputs
+
+    def save(
+            self,
+            key: str,
+            stage: str,
+            arrays: dict[str, np.ndarray],
+            objects: dict | None = None,
+    ) -> dict:
+        """Stores stage outputs under `key` and returns them loaded back.
+
+        The entry is written to a temporary folder and renamed, so a
+        crashed run never leaves a partial entry behind.
+
+        :param key: stage key.
+        :type key: str
+        :param stage: stage name, for the logs.
+        :type stage: str
+        :param arrays: arrays by name.
+        :type arrays: dict
+        :param objects: other picklable outputs by name.
+        :type objects: dict
+
+        :return: arrays (memory-mapped) and objects by name
+        :rtype: dict
+        """
+        from joblib import dump
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = Path(tempfile.mkdtemp(dir=self.root, prefix='.tmp_'))
+        try:
+            for name, array in arrays.items():
+                np.save(tmp_path / f'{name}.npy', np.asarray(array))
+            if objects:
+                dump(objects, tmp_path / self.OBJECTS_FILE)
+            meta = {
+                'stage': stage,
+                'arrays': list(arrays),
+                'objects': bool(objects),
+            }
+            (tmp_path / self.META_FILE).write_text(json.dumps(meta))
+
+            path = self._path(key)
+            if path.exists():
+                shutil.rmtree(path)
+            tmp_path.rename(path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        logger.info('Stage %s saved to the cache.', stage)
+        self.evict(keep=key)
+        return self.load(key)
+
+    def cached(self, key: str, stage: str, compute) -> dict:
+        """Returns the outputs under `key`, computing and storing them on a miss.
+
+        :param key: stage key.
+        :type key: str
+        :param stage: stage name, for the logs.
+        :type stage: str
+        :param compute: callable returning the (arrays, objects) dicts.
+
+        :return: arrays (memory-mapped) and objects by name
+        :rtype: dict
+        """
+        outputs = self.load(key)
+        if outputs is None:
+            arrays, objects = compute()
+            outputs = self.save(key, stage, arrays, objects)
+        return outputs
+
+    def entries(self) -> list[tuple[Path, float, int]]:
+        """Returns the (path, last use, size) of the entries, oldest first."""
+        entries = []
+        if not self.root.exists():
+            return entries
+        for path in self.root.iterdir():
+            if not path.is_dir() or path.name.startswith('.tmp_'):
+                continue
+            size = sum(f.stat().st_size for f in path.iterdir())
+            entries.append((path, path.stat().st_mtime, size))
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def evict(self, keep: str | None = None):
+        """Deletes the least recently used entries over the size limit.
+
+        :param keep: key which is never evicted.
+        :type keep: str
+        """
+        entries = self.entries()
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if path.name == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.info('Cache entry %s evicted.', path.name)
+
+    def clear(self):
+        """Deletes all the entries."""
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,76 @@
+"""Checkpoints of the cluster-count sweep."""
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class SweepCheckpoint:
+    """Append-only JSON lines file of sweep results.
+
+    Each line holds the scores of one (data fingerprint, n_components,
+    random_state) fit. Lines are flushed to disk as soon as a fit
+    finishes, so an interrupted sweep loses at most the running fits.
+
+    :param path: path of the checkpoint file.
+    :type path: Path
+    :param fingerprint: fingerprint of the data and mixture settings.
+    :type fingerprint: str
+    """
+
+    def __init__(self, path: Path, fingerprint: str):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+
+    def load(self) -> dict[tuple[int, int], dict]:
+        """Returns the stored results for this fingerprint.
+
+        :return: results keyed by (n_components, random_state)
+        :rtype: dict
+        """
+        results = {}
+        if not self.path.exists():
+            return results
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Partially written last line of an interrupted sweep
+                    continue
+                if record.get('fingerprint') == self.fingerprint:
+                    results[(record['n_components'], record['random_state'])] = record
+        logger.info(
+            '%d checkpointed sweep results loaded from %s', len(results), self.path
+        )
+        return results
+
+    def append(
+            self,
+            n_components: int,
+            random_state: int,
+            aic: float,
+            bic: float,
+            sil: float,
+    ) -> dict:
+        """Persists the result of one fit.
+
+        :return: stored record
+        :rtype: dict
+        """
+        record = {
+            'fingerprint': self.fingerprint,
+            'n_components': int(n_components),
+            'random_state': int(random_state),
+            'aic': float(aic),
+            'bic': float(bic),
+            'sil': float(sil),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return record
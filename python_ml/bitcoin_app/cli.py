@@ -0,0 +1,366 @@
+"""Command line interface.
+
+Heavy dependencies (pandas, scikit-learn, matplotlib, joblib, pydantic)
+are imported inside the subcommands which need them, so `--help` and
+short commands start fast.
+"""
+import argparse
+import logging
+import sys
+
+from bitcoin_app.logging_config import logger_config
+
+logger = logging.getLogger(__name__)
+
+
+def fit(settings, args):
+    """Fit scaler, PCA and GaussianMixture, save the model and the dataset."""
+    from joblib import dump
+    from bitcoin_app.clustering import predict_clusters
+    from bitcoin_app.pipeline import (
+        dataset_frame, fit_stage, preprocess_stages, stage_cache,
+    )
+    from bitcoin_app.save_dataset import save_dataset
+
+    cache = stage_cache(settings)
+    idx, X, scaler, pca, X_pca, pca_key = preprocess_stages(settings, cache)
+    gmm = fit_stage(settings, X_pca, cache, pca_key)
+
+    dump((scaler, pca, gmm), settings.model_path)
+    logger.info('Model has been saved to %s', settings.model_path)
+
+    _, clusters_proba = predict_clusters(
+        gmm,
+        X_pca,
+        chunk_size=settings.scoring.chunk_size,
+        n_jobs=settings.scoring.n_jobs,
+        output_paths=settings.scoring_paths,
+    )
+
+    save_dataset(
+        df=dataset_frame(settings, idx, X),
+        X_pca=X_pca,
+        X_proba=clusters_proba,
+        path=settings.dataset.dataset_save_path,
+    )
+
+
+def sweep(settings, args):
+    """Search for the optimal number of clusters."""
+    from bitcoin_app.clustering import find_n_clusters
+    from bitcoin_app.pipeline import preprocess_stages, stage_cache
+
+    _, _, _, _, X_pca, _ = preprocess_stages(settings, stage_cache(settings))
+
+    find_n_clusters(
+        X=X_pca,
+        n_components=settings.find_clusters.n_components,
+        random_state=settings.find_clusters.random_state,
+        verbose=settings.find_clusters.verbose,
+        plot_path=settings.find_clusters.plot_path,
+        engine=settings.clustering.engine,
+        n_seeds=settings.find_clusters.n_seeds,
+        checkpoint_path=settings.find_clusters.checkpoint_path,
+    )
+
+
+def score(settings, args):
+    """Assign clusters to the dataset with the saved model."""
+    from joblib import load
+    from bitcoin_app.clustering import predict_clusters
+    from bitcoin_app.data_processing import data_transform
+    from bitcoin_app.pipeline import dataset_frame, load_stage, stage_cache
+    from bitcoin_app.save_dataset import save_dataset
+
+    scaler, pca, gmm = load(settings.model_path)
+    logger.info('Model has been loaded from %s', settings.model_path)
+
+    _, idx, X = load_stage(settings, stage_cache(settings))
+    X_pca = data_transform(X, scaler, pca)
+
+    _, clusters_proba = predict_clusters(
+        gmm,
+        X_pca,
+        chunk_size=settings.scoring.chunk_size,
+        n_jobs=settings.scoring.n_jobs,
+        output_paths=settings.scoring_paths,
+    )
+
+    save_dataset(
+        df=dataset_frame(settings, idx, X),
+        X_pca=X_pca,
+        X_proba=clusters_proba,
+        path=settings.dataset.dataset_save_path,
+    )
+
+
+def cache(settings, args):
+    """Show or clear the cache of the pipeline stages."""
+    from bitcoin_app.pipeline import stage_cache
+
+    stages = stage_cache(settings)
+    if stages is None:
+        logger.info('The stage cache is disabled.')
+        return
+    if args.clear:
+        stages.clear()
+        logger.info('Stage cache %s has been cleared.', stages.root)
+        return
+    entries = stages.entries()
+    logger.info(
+        'Stage cache %s: %d entries, %.1f MB of %.1f MB.',
+        stages.root, len(entries),
+        sum(size for _, _, size in entries) / 1e6, stages.max_bytes / 1e6,
+    )
+
+
+def blocks(settings, args):
+    """Compute fees, fee rates and intervals of the blocks."""
+    from bitcoin_app.blocks import block_analytics
+
+    blocks_settings = settings.blocks
+    metrics, rolling, summary = block_analytics(
+        folder=blocks_settings.blocks_dir,
+        window=blocks_settings.rolling_window,
+        bucket_size=settings.dataset.bucket_size,
+    )
+    for df, path in (
+            (metrics, blocks_settings.metrics_path),
+            (rolling, blocks_settings.rolling_path),
+            (summary, blocks_settings.buckets_path),
+    ):
+        df.to_csv(path, index=False)
+        logger.info('%d rows have been saved to %s', len(df), path)
+
+
+def export(settings, args):
+    """Write the clustered dataset in the format imported by the dashboard."""
+    import pandas as pd
+
+    df = pd.read_csv(settings.dataset.dataset_save_path)
+    logger.info('Clustered dataset has been loaded. DF shape: %s', df.shape)
+
+    # Dominant cluster, 1-based like the probability columns
+    proba_cols = [col for col in df.columns if col.startswith('Cluster_')]
+    df.insert(
+        df.columns.get_loc(proba_cols[0]),
+        'Cluster',
+        df[proba_cols].to_numpy().argmax(axis=1) + 1,
+    )
+
+    sample_size = settings.export.sample_size
+    if sample_size is not None and sample_size < len(df):
+        df = df.sample(n=sample_size, random_state=settings.export.random_state)
+        logger.info('Dataset has been sampled. DF shape: %s', df.shape)
+
+    df.to_csv(settings.export.export_path, index=False)
+    logger.info('Dataset has been exported to %s', settings.export.export_path)
+
+
+def import_(settings, args):
+    """Import the exported dataset into the dashboard database."""
+    import subprocess
+
+    script = settings.export.import_script_path
+    logger.info('Running %s', script)
+    subprocess.run([sys.executable, str(script)], check=True)
+
+
+COMMANDS = {
+    'fit': fit,
+    'sweep': sweep,
+    'score': score,
+    'export': export,
+    'import': import_,
+    'cache': cache,
+    'blocks': blocks,
+}
+
+
+def _window(value: str) -> dict:
+    """Parse a block height window, `START:END` (either may be empty) or
+    `last:N`."""
+    first, sep, second = value.partition(':')
+    if not sep:
+        raise argparse.ArgumentTypeError('expected START:END or last:N')
+    try:
+        if first == 'last':
+            return {'last_blocks': int(second)}
+        return {
+            'start': int(first) if first else None,
+            'end': int(second) if second else None,
+        }
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected START:END or last:N')
+
+
+def _engine_parser() -> argparse.ArgumentParser:
+    """Options of the GaussianMixture engine, shared by `fit` and `sweep`."""
+    parser = argparse.ArgumentParser(add_help=False)
+    engine = parser.add_argument_group('mixture engine')
+    engine.add_argument(
+        '--covariance-type', dest='engine_covariance_type',
+        choices=('full', 'diag', 'tied', 'spherical'),
+        help='covariance type of the components.',
+    )
+    engine.add_argument(
+        '--dtype', dest='engine_dtype', choices=('float64', 'float32'),
+        help='precision of the EM computation.',
+    )
+    engine.add_argument(
+        '--n-threads', dest='engine_n_threads', type=int, metavar='N',
+        help='E-step threads, -1 for all cores.',
+    )
+    engine.add_argument(
+        '--e-step-chunk-size', dest='engine_chunk_size', type=int, metavar='ROWS',
+        help='E-step rows per chunk.',
+    )
+    engine.add_argument(
+        '--n-init', dest='engine_n_init', type=int, metavar='N',
+        help='number of initializations, the best one is kept.',
+    )
+    engine.add_argument(
+        '--init-n-jobs', dest='engine_init_n_jobs', type=int, metavar='N',
+        help='processes running the initializations, -1 for all cores.',
+    )
+    engine.add_argument(
+        '--tol', dest='engine_tol', type=float, metavar='TOL',
+        help='convergence threshold of the lower bound.',
+    )
+    engine.add_argument(
+        '--max-iter', dest='engine_max_iter', type=int, metavar='N',
+        help='maximum number of EM iterations.',
+    )
+    return parser
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='bitcoin_app',
+        description='Bitcoin entity clustering pipeline.',
+    )
+    parser.set_defaults(command=None)
+    parser.add_argument(
+        '--window', type=_window, metavar='START:END|last:N',
+        help='block height window of the entity features, e.g. 840000: or '
+             'last:4032, instead of lifetime totals.',
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='neither read nor write the cache of the pipeline stages.',
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    engine_parser = _engine_parser()
+
+    fit_parser = subparsers.add_parser(
+        'fit', help=fit.__doc__, parents=[engine_parser]
+    )
+    fit_parser.add_argument(
+        '--n-components', type=int, help='number of clusters.'
+    )
+    fit_parser.add_argument(
+        '--fit-mode', choices=('full', 'coreset'),
+        help='fit on all the rows or with weighted EM on a stratified coreset.',
+    )
+    coreset = fit_parser.add_argument_group('coreset')
+    coreset.add_argument(
+        '--coreset-size', dest='coreset_sample_size', type=int, metavar='ROWS',
+        help='maximum number of rows of the coreset.',
+    )
+    coreset.add_argument(
+        '--coreset-bins', dest='coreset_n_bins', type=int, metavar='N',
+        help='bins per principal component of the stratification.',
+    )
+    coreset.add_argument(
+        '--coreset-min-per-cell', dest='coreset_min_per_cell', type=int, metavar='N',
+        help='minimum number of rows drawn from a non-empty cell.',
+    )
+    coreset.add_argument(
+        '--coreset-validation-size', dest='coreset_validation_size', type=int,
+        metavar='ROWS', help='rows held out to measure the log-likelihood.',
+    )
+    coreset.add_argument(
+        '--coreset-random-state', dest='coreset_random_state', type=int, metavar='N',
+        help='random state of the sampling, the clustering one by default.',
+    )
+    coreset.add_argument(
+        '--compare-full-fit', dest='coreset_compare_full_fit',
+        action='store_true', default=None,
+        help='also fit on all the rows and report the log-likelihood gap.',
+    )
+    sweep_parser = subparsers.add_parser(
+        'sweep', help=sweep.__doc__, parents=[engine_parser]
+    )
+    sweep_parser.add_argument(
+        '--n-components', type=int, nargs='+', metavar=('MIN', 'MAX'),
+        help='min, max (excluded) and optional step of the numbers of clusters.',
+    )
+    sweep_parser.add_argument(
+        '--n-seeds', type=int, help='number of random states per number of clusters.'
+    )
+    sweep_parser.add_argument(
+        '--no-checkpoint', action='store_true',
+        help='neither read nor write the sweep checkpoint.',
+    )
+    subparsers.add_parser('score', help=score.__doc__)
+    cache_parser = subparsers.add_parser('cache', help=cache.__doc__)
+    cache_parser.add_argument(
+        '--clear', action='store_true', help='delete all the cached stages.'
+    )
+    blocks_parser = subparsers.add_parser('blocks', help=blocks.__doc__)
+    blocks_parser.add_argument(
+        '--rolling-window', type=int, help='number of blocks of the rolling statistics.'
+    )
+    export_parser = subparsers.add_parser('export', help=export.__doc__)
+    export_parser.add_argument(
+        '--sample-size', type=int, help='number of entities to export.'
+    )
+    subparsers.add_parser('import', help=import_.__doc__)
+
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    """Run a pipeline subcommand.
+
+    Without a subcommand, runs `sweep` if `find_clustering` is set in the
+    settings and `fit` otherwise.
+    """
+    args = _parser().parse_args(argv)
+    logger_config()
+
+    from bitcoin_app.settings import Settings
+
+    settings = Settings()
+    if args.no_cache:
+        settings.cache.enabled = False
+    if args.window is not None:
+        for name, value in args.window.items():
+            setattr(settings.dataset.window, name, value)
+    if args.command == 'sweep':
+        if args.n_components is not None:
+            settings.find_clusters.n_components = tuple(args.n_components)
+        if args.n_seeds is not None:
+            settings.find_clusters.n_seeds = args.n_seeds
+        if args.no_checkpoint:
+            settings.find_clusters.checkpoint = False
+    elif getattr(args, 'n_components', None) is not None:
+        settings.clustering.n_components = args.n_components
+    if getattr(args, 'fit_mode', None) is not None:
+        settings.clustering.fit_mode = args.fit_mode
+    for prefix, group in (
+            ('engine', settings.clustering.engine),
+            ('coreset', settings.clustering.coreset),
+    ):
+        for name in type(group).model_fields:
+            value = getattr(args, f'{prefix}_{name}', None)
+            if value is not None:
+                setattr(group, name, value)
+    if getattr(args, 'rolling_window', None) is not None:
+        settings.blocks.rolling_window = args.rolling_window
+    if getattr(args, 'sample_size', None) is not None:
+        settings.export.sample_size = args.sample_size
+
+    command = args.command or ('sweep' if settings.find_clustering else 'fit')
+    logger.info('Running %s', command)
+    COMMANDS[command](settings, args)
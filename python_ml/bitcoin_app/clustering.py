@@ -1,18 +1,21 @@
 """Clustering methods."""
+from __future__ import annotations
+
 import logging
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from joblib import Parallel, delayed
-import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.mixture import GaussianMixture
-from sklearn.metrics import silhouette_score, pairwise_distances
 
-from bitcoin_app.logging_config import logger_config
+from bitcoin_app.mixture import fit_mixture, make_mixture
+from bitcoin_app.scoring import score_chunked
+
+if TYPE_CHECKING:
+    from bitcoin_app.settings import CoresetSettings, MixtureEngineSettings
 
 
 logger = logging.getLogger(__name__)
-logger_config(logger)
 
 
 def compute_scores(
@@ -20,6 +23,7 @@ def compute_scores(
         n_components: int,
         random_state: int,
         verbose: bool,
+        engine: MixtureEngineSettings | None = None,
 ) -> tuple[int, float, float, float]:
     """Compute AIC, BIC, Silhouette scores  for given number of clusters.
 
@@ -32,9 +36,13 @@ def compute_scores(
     :type random_state: int
     :param verbose: if True, the ongoing statistics will be std out.
     :type verbose: bool
+    :param engine: mixture engine settings, defaults if None.
+    :type engine: MixtureEngineSettings
 
     :return: number of clusters, AIC, BIC, Silhouette scores
     """
+    from sklearn.metrics import silhouette_score
+
     if verbose:
         logger.info(
             'GMM for %d components started',
@@ -42,13 +50,10 @@ def compute_scores(
         )
 
     # Run GaussianMixture
-    gmm = GaussianMixture(
+    gmm = make_mixture(
         n_components=n_components,
         random_state=random_state,
-        # covariance_type='diag',
-        init_params='kmeans',
-        tol=1e-3,
-        max_iter=100,
+        engine=engine,
         verbose=verbose,
         verbose_interval=1,
     )
@@ -94,19 +99,39 @@ def compute_scores(
     return n_components, aic, bic, sil
 
 
+def _sweep_scores(X, n_components, random_state, verbose, engine):
+    # Runs in a joblib worker process, where logging is not configured yet
+    from bitcoin_app.logging_config import logger_config
+
+    logger_config()
+    return random_state, compute_scores(
+        X, n_components, random_state, verbose, engine
+    )
+
 
 def find_n_clusters(
         X: np.ndarray,
-        n_components: tuple[int, int],
+        n_components: tuple[int, ...],
         random_state: int,
         verbose: bool,
         plot_path: Path,
+        engine: MixtureEngineSettings | None = None,
+        n_seeds: int = 1,
+        checkpoint_path: Path | None = None,
 ):
     """Tries to find the optimal number of clusters for GaussianMixture.
 
+    Every (number of clusters, random state) fit is scored as soon as it
+    finishes and, with `checkpoint_path`, appended to the checkpoint file
+    together with a fingerprint of the data and the engine settings. Fits
+    already stored for the same fingerprint are skipped, so an interrupted
+    sweep resumes where it stopped and a range can be extended or refined
+    (e.g. with a step) without recomputing the known points.
+
     :param X: dataset
     :type X: numpy.ndarray
-    :param n_components: min and max number of clusters to be tested.
+    :param n_components: min, max (excluded) and optional step of the
+        numbers of clusters to be tested.
     :type n_components: tuple
     :param random_state: random state for the GaussianMixture.
     :type random_state: int
@@ -114,23 +139,63 @@ def find_n_clusters(
     :type verbose: bool
     :param plot_path: path where the resulted plot will be saved.
     :type plot_path: Path
+    :param engine: mixture engine settings, defaults if None.
+    :type engine: MixtureEngineSettings
+    :param n_seeds: number of random states per number of clusters, starting
+        at `random_state`; the plotted scores are averaged over them.
+    :type n_seeds: int
+    :param checkpoint_path: checkpoint file of the results, None to disable.
+    :type checkpoint_path: Path
     """
+    # Only the sweep needs these, keep them out of the import path
+    from joblib import Parallel, delayed
+    import matplotlib.pyplot as plt
 
     n_components = np.arange(*n_components)
-    # Run clustering with different n_components
-    results = Parallel(n_jobs=-1)(
-        delayed(compute_scores)(X, n, random_state, verbose)
-        for n in n_components
+    seeds = range(random_state, random_state + n_seeds)
+
+    checkpoint = None
+    done = {}
+    if checkpoint_path is not None:
+        from bitcoin_app.checkpoint import SweepCheckpoint
+        from bitcoin_app.fingerprint import array_fingerprint, value_fingerprint
+
+        fingerprint = value_fingerprint(
+            array_fingerprint(X),
+            None if engine is None else engine.model_dump(),
+        )
+        checkpoint = SweepCheckpoint(checkpoint_path, fingerprint)
+        done = checkpoint.load()
+
+    todo = [
+        (int(n), seed) for n in n_components for seed in seeds
+        if (int(n), seed) not in done
+    ]
+    logger.info(
+        'Sweep: %d fits to run, %d already checkpointed.',
+        len(todo), n_components.shape[0] * n_seeds - len(todo),
+    )
+
+    # Run clustering with different n_components, store results as they come
+    results = Parallel(n_jobs=-1, return_as='generator_unordered')(
+        delayed(_sweep_scores)(X, n, seed, verbose, engine)
+        for n, seed in todo
     )
+    for seed, (n, aic, bic, sil) in results:
+        record = {'aic': aic, 'bic': bic, 'sil': sil}
+        if checkpoint is not None:
+            record = checkpoint.append(n, seed, aic, bic, sil)
+        done[(n, seed)] = record
 
-    # Save results
+    # Average the scores over the random states
     scores_AIC = np.zeros(n_components.shape[0], dtype=np.float32)
     scores_BIC = np.zeros(n_components.shape[0], dtype=np.float32)
     scores_sil = np.zeros(n_components.shape[0], dtype=np.float32)
-    for i, (n, aic, bic, sil) in enumerate(results):
-        scores_AIC[i] = aic
-        scores_BIC[i] = bic
-        scores_sil[i] = sil
+    for i, n in enumerate(n_components):
+        records = [done[(int(n), seed)] for seed in seeds]
+        scores_AIC[i] = np.mean([record['aic'] for record in records])
+        scores_BIC[i] = np.mean([record['bic'] for record in records])
+        scores_sil[i] = np.mean([record['sil'] for record in records])
 
     # Plot metrics
     _, ax = plt.subplots(1, 1, figsize=(12, 8))
@@ -156,12 +221,14 @@ def find_n_clusters(
     plt.close()
 
 
-def clustering(
+def fit_gmm(
         X: np.ndarray,
         n_components: int,
         random_state: int,
-) -> tuple[np.ndarray, np.ndarray]:
-    """Clustering based on GaussianMixture.
+        engine: MixtureEngineSettings | None = None,
+        coreset: CoresetSettings | None = None,
+) -> GaussianMixture:
+    """Fit GaussianMixture.
 
     :param X: dataset
     :type X: numpy.ndarray
@@ -169,30 +236,74 @@ def clustering(
     :type n_components: int
     :param random_state: random state for the GaussianMixture.
     :type random_state: int
+    :param engine: mixture engine settings, defaults if None.
+    :type engine: MixtureEngineSettings
+    :param coreset: if given, the mixture is fitted on a weighted coreset.
+    :type coreset: CoresetSettings
 
-    :return: clusters and prob distribution
-    :rtype: numpy.ndarray
+    :return: fitted GaussianMixture
+    :rtype: GaussianMixture
     """
     logger.info(
         'GMM for %d components started',
         n_components
     )
 
-    gmm = GaussianMixture(
-        n_components=n_components,
-        random_state=random_state,
-        init_params='kmeans',
-        tol=1e-3,
-        max_iter=100,
-        verbose=True,
-        verbose_interval=1,
-    )
-    gmm.fit(X)
+    if coreset is not None:
+        from bitcoin_app.coreset import fit_coreset_mixture
+
+        gmm = fit_coreset_mixture(
+            X,
+            n_components=n_components,
+            random_state=random_state,
+            coreset=coreset,
+            engine=engine,
+            verbose=True,
+            verbose_interval=1,
+        )
+    else:
+        gmm = fit_mixture(
+            X,
+            n_components=n_components,
+            random_state=random_state,
+            engine=engine,
+            verbose=True,
+            verbose_interval=1,
+        )
     logger.info('GMM fitted')
 
-    clusters = gmm.predict(X)
-    clusters_proba = gmm.predict_proba(X)
-    # print(clusters_prob.shape)
+    return gmm
+
+
+def predict_clusters(
+        gmm: GaussianMixture,
+        X: np.ndarray,
+        chunk_size: int = 262144,
+        n_jobs: int = 1,
+        output_paths: tuple[Path, Path] | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Assign clusters with a fitted GaussianMixture.
+
+    :param gmm: fitted GaussianMixture
+    :type gmm: GaussianMixture
+    :param X: dataset
+    :type X: numpy.ndarray
+    :param chunk_size: number of rows scored at once.
+    :type chunk_size: int
+    :param n_jobs: number of worker processes, -1 for all cores, ignored
+        (one process) without `output_paths`.
+    :type n_jobs: int
+    :param output_paths: paths to the memory-mapped clusters and
+        probabilities, in-memory if None.
+    :type output_paths: tuple
+
+    :return: clusters and prob distribution (float32)
+    :rtype: numpy.ndarray
+    """
+    n_components = gmm.n_components
+    clusters, clusters_proba = score_chunked(
+        gmm, X, chunk_size=chunk_size, n_jobs=n_jobs, output_paths=output_paths,
+    )
 
     clusters_count = np.unique(clusters, return_counts=True)
     logger.info(
@@ -205,3 +316,27 @@ def clustering(
     )
 
     return clusters, clusters_proba
+
+
+def clustering(
+        X: np.ndarray,
+        n_components: int,
+        random_state: int,
+        engine: MixtureEngineSettings | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Clustering based on GaussianMixture.
+
+    :param X: dataset
+    :type X: numpy.ndarray
+    :param n_components: number of clusters.
+    :type n_components: int
+    :param random_state: random state for the GaussianMixture.
+    :type random_state: int
+    :param engine: mixture engine settings, defaults if None.
+    :type engine: MixtureEngineSettings
+
+    :return: clusters and prob distribution
+    :rtype: numpy.ndarray
+    """
+    gmm = fit_gmm(X, n_components, random_state, engine)
+    return predict_clusters(gmm, X)
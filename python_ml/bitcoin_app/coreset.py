@@ -0,0 +1,219 @@
+"""Coreset fitting of the GaussianMixture."""
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from bitcoin_app.mixture import ChunkedGaussianMixture, fit_mixture
+
+if TYPE_CHECKING:
+    from bitcoin_app.settings import CoresetSettings, MixtureEngineSettings
+
+logger = logging.getLogger(__name__)
+
+
+def _cell_quotas(
+        counts: np.ndarray,
+        sample_size: int,
+        min_per_cell: int,
+        rng: np.random.Generator,
+) -> np.ndarray:
+    """Number of rows sampled from every cell, `sample_size` in total.
+
+    Each cell keeps `min_per_cell` rows (or all of them), and the rest of
+    the budget is shared proportionally to the cell sizes by largest
+    remainders. If the floors alone exceed the budget, every cell gets the
+    same number of rows and the leftover rows go to random larger cells.
+
+    :param counts: number of rows of every cell.
+    :type counts: numpy.ndarray
+    :param sample_size: number of rows to sample.
+    :type sample_size: int
+    :param min_per_cell: minimum number of rows per cell.
+    :type min_per_cell: int
+    :param rng: random generator.
+    :type rng: numpy.random.Generator
+
+    :return: rows per cell
+    :rtype: numpy.ndarray
+    """
+    n_samples = int(counts.sum())
+    if sample_size >= n_samples:
+        return counts.copy()
+
+    floor = np.minimum(counts, min_per_cell)
+    if floor.sum() > sample_size:
+        per_cell = min_per_cell
+        while np.minimum(counts, per_cell).sum() > sample_size:
+            per_cell -= 1
+        quota = np.minimum(counts, per_cell)
+        larger = np.flatnonzero(counts > per_cell)
+        extra = rng.choice(larger, sample_size - int(quota.sum()), replace=False)
+        quota[extra] += 1
+        return quota
+
+    # Proportional share above the floor, scaled to the remaining budget
+    budget = sample_size - int(floor.sum())
+    wanted = np.maximum(sample_size * counts / n_samples - floor, 0)
+    share = wanted * (budget / wanted.sum()) if budget else np.zeros(len(counts))
+    extra = np.floor(share).astype(np.int64)
+    leftover = budget - int(extra.sum())
+    extra[np.argsort(extra - share, kind='stable')[:leftover]] += 1
+    return floor + extra
+
+
+def stratified_coreset(
+        X: np.ndarray,
+        sample_size: int,
+        n_bins: int,
+        min_per_cell: int,
+        random_state: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Density-aware stratified subsample with importance weights.
+
+    Rows are binned on a grid of `n_bins` equal-width bins per feature over
+    `arcsinh(X)`, which compresses the heavy tails. Every cell is sampled
+    proportionally to its size but keeps at least `min_per_cell` rows, so
+    the dense mass of near-duplicate rows is thinned out while sparse
+    cells (large, rare entities) are kept whole. The coreset never exceeds
+    `sample_size` rows, see `_cell_quotas`. Each sampled row is weighted by
+    `cell count / cell sample`, so the weights sum to `n` as long as every
+    cell is sampled.
+
+    :param X: dataset
+    :type X: numpy.ndarray
+    :param sample_size: number of rows of the coreset (or all the rows).
+    :type sample_size: int
+    :param n_bins: number of bins per feature.
+    :type n_bins: int
+    :param min_per_cell: minimum number of rows kept per non-empty cell.
+    :type min_per_cell: int
+    :param random_state: random state for the sampling.
+    :type random_state: int
+
+    :return: sorted indexes of the sampled rows and their weights
+    :rtype: tuple
+    """
+    rng = np.random.default_rng(random_state)
+    n_samples, n_features = X.shape
+
+    X_t = np.arcsinh(X)
+    cells = np.zeros(n_samples, dtype=np.int64)
+    for j in range(n_features):
+        low, high = X_t[:, j].min(), X_t[:, j].max()
+        width = (high - low) / n_bins or 1.0
+        bins = np.minimum(((X_t[:, j] - low) / width).astype(np.int64), n_bins - 1)
+        cells = cells * n_bins + bins
+
+    _, inverse, counts = np.unique(cells, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    quota = _cell_quotas(counts, sample_size, min_per_cell, rng)
+
+    # Random rank of every row inside its cell
+    order = np.lexsort((rng.random(n_samples), inverse))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(n_samples) - starts[inverse[order]]
+    selected = np.sort(order[rank < quota[inverse[order]]])
+
+    # Cells without rows in the coreset (more cells than sample_size) have
+    # no weight to carry
+    cell_weights = np.divide(counts, quota, out=np.zeros(len(counts)), where=quota > 0)
+    weights = cell_weights[inverse[selected]]
+
+    logger.info(
+        'Coreset: %d of %d rows from %d cells.',
+        selected.shape[0], n_samples, counts.shape[0],
+    )
+    return selected, weights
+
+
+def fit_coreset_mixture(
+        X: np.ndarray,
+        n_components: int,
+        random_state: int,
+        coreset: CoresetSettings,
+        engine: MixtureEngineSettings | None = None,
+        **kwargs,
+) -> ChunkedGaussianMixture:
+    """Fit the mixture with weighted EM on a stratified coreset.
+
+    A random validation slice is held out. The coreset is drawn from the
+    other rows and the mean log-likelihood of the fitted mixture is
+    measured on the validation slice. If `coreset.compare_full_fit` is set,
+    a mixture is also fitted on all the other rows and the log-likelihood
+    gap (full - coreset) is reported. The report is stored in the
+    `coreset_report_` attribute of the returned mixture.
+
+    :param X: dataset
+    :type X: numpy.ndarray
+    :param n_components: number of clusters.
+    :type n_components: int
+    :param random_state: random state for the mixture, and for the sampling
+        unless `coreset.random_state` is set.
+    :type random_state: int
+    :param coreset: coreset settings.
+    :type coreset: CoresetSettings
+    :param engine: mixture engine settings, defaults if None.
+    :type engine: MixtureEngineSettings
+    :param kwargs: other GaussianMixture parameters.
+
+    :return: fitted mixture
+    :rtype: ChunkedGaussianMixture
+    """
+    sampling_state = random_state if coreset.random_state is None else coreset.random_state
+    rng = np.random.default_rng(sampling_state)
+    n_samples = X.shape[0]
+    validation_size = min(coreset.validation_size, n_samples // 10)
+    permutation = rng.permutation(n_samples)
+    validation = np.sort(permutation[:validation_size])
+    train = np.sort(permutation[validation_size:])
+    X_train, X_val = X[train], X[validation]
+
+    idx, weights = stratified_coreset(
+        X_train,
+        sample_size=coreset.sample_size,
+        n_bins=coreset.n_bins,
+        min_per_cell=coreset.min_per_cell,
+        random_state=sampling_state,
+    )
+    gmm = fit_mixture(
+        X_train[idx],
+        n_components=n_components,
+        random_state=random_state,
+        engine=engine,
+        sample_weight=weights,
+        **kwargs,
+    )
+
+    report = {
+        'n_rows': int(X_train.shape[0]),
+        'coreset_rows': int(idx.shape[0]),
+        'validation_rows': int(validation_size),
+        'coreset_log_likelihood': float(gmm.score(X_val)),
+    }
+    logger.info(
+        'Coreset GMM: validation log-likelihood %.6f',
+        report['coreset_log_likelihood'],
+    )
+
+    if coreset.compare_full_fit:
+        full = fit_mixture(
+            X_train,
+            n_components=n_components,
+            random_state=random_state,
+            engine=engine,
+            **kwargs,
+        )
+        report['full_log_likelihood'] = float(full.score(X_val))
+        report['log_likelihood_gap'] = (
+            report['full_log_likelihood'] - report['coreset_log_likelihood']
+        )
+        logger.info(
+            'Full GMM: validation log-likelihood %.6f | gap: %.6f',
+            report['full_log_likelihood'], report['log_likelihood_gap'],
+        )
+
+    gmm.coreset_report_ = report
+    return gmm
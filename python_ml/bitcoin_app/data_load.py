@@ -5,10 +5,7 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
-from bitcoin_app.logging_config import logger_config
-
 logger = logging.getLogger(__name__)
-logger_config(logger)
 
 def load_dataset(
         path: Path,
@@ -58,3 +55,134 @@ def load_dataset(
     )
 
     return idx, X, df
+
+
+def window_buckets(
+        path: Path,
+        bucket_size: int,
+        start: int | None = None,
+        end: int | None = None,
+        last_blocks: int | None = None,
+        chunk_size: int = 5000000,
+) -> tuple[int, int | None]:
+    """Height buckets overlapping a block height window.
+
+    :param path: the path to the partitioned dataset.
+    :type path: Path
+    :param bucket_size: number of blocks per bucket.
+    :type bucket_size: int
+    :param start: first block height, None for the start of the data.
+    :type start: int
+    :param end: block height after the window, None for the end of the data.
+    :type end: int
+    :param last_blocks: if set, the window is the last blocks of the data.
+    :type last_blocks: int
+    :param chunk_size: number of rows read at once.
+    :type chunk_size: int
+
+    :return: first bucket and bucket after the window (None for no limit)
+    :rtype: tuple
+    """
+    if last_blocks is not None:
+        last_bucket = max(
+            chunk['HEIGHT_BUCKET'].max()
+            for chunk in pd.read_csv(
+                path, usecols=['HEIGHT_BUCKET'], chunksize=chunk_size,
+            )
+        )
+        end = (int(last_bucket) + 1) * bucket_size
+        start = end - last_blocks
+
+    for bound in (start, end):
+        if bound is not None and bound % bucket_size:
+            logger.warning(
+                'Window bound %d is not a multiple of the bucket size %d, '
+                'the overlapping bucket is included.',
+                bound, bucket_size,
+            )
+
+    first = 0 if start is None else max(start, 0) // bucket_size
+    stop = None if end is None else -(-end // bucket_size)
+    return first, stop
+
+
+def load_window(
+        path: Path,
+        dtype: dict,
+        drop_na: bool,
+        bucket_size: int,
+        start: int | None = None,
+        end: int | None = None,
+        last_blocks: int | None = None,
+        chunk_size: int = 5000000,
+) -> tuple[np.ndarray, np.ndarray, pd.DataFrame]:
+    """Load entity features summed over the height buckets of a window.
+
+    The dataset holds one row per entity and block height bucket, with an
+    HEIGHT_BUCKET column after ENTITY_ID. The buckets of the window are
+    summed per entity in chunks. Transaction counts and amounts add up
+    exactly, while address counts are an upper bound of the distinct
+    addresses: an address active in several buckets is counted in each.
+
+    :param path: the path to the partitioned dataset.
+    :type path: Path
+    :param dtype: data types of the columns.
+    :type dtype: dict
+    :param drop_na: if True, NAN values will be dropped.
+    :type drop_na: bool
+    :param bucket_size: number of blocks per bucket.
+    :type bucket_size: int
+    :param start: first block height, None for the start of the data.
+    :type start: int
+    :param end: block height after the window, None for the end of the data.
+    :type end: int
+    :param last_blocks: if set, the window is the last blocks of the data.
+    :type last_blocks: int
+    :param chunk_size: number of rows read at once.
+    :type chunk_size: int
+
+    :return: numpy arrays with entity ids and values, and the DataFrame
+    :rtype: tuple
+    """
+    first, stop = window_buckets(
+        path, bucket_size, start, end, last_blocks, chunk_size
+    )
+    logger.info(
+        'Loading height buckets [%d, %s) of %s.',
+        first, 'end' if stop is None else stop, path,
+    )
+
+    id_col = next(iter(dtype))
+    partials = []
+    for chunk in pd.read_csv(
+            path,
+            header=0,
+            dtype={**dtype, 'HEIGHT_BUCKET': 'int64'},
+            chunksize=chunk_size,
+    ):
+        in_window = chunk['HEIGHT_BUCKET'] >= first
+        if stop is not None:
+            in_window &= chunk['HEIGHT_BUCKET'] < stop
+        chunk = chunk[in_window].drop(columns='HEIGHT_BUCKET')
+        if drop_na:
+            chunk = chunk.dropna(how='any')
+        partials.append(chunk.groupby(id_col, sort=False).sum())
+
+    df = (
+        pd.concat(partials)
+        .groupby(level=0)
+        .sum()
+        .reset_index()
+        .astype(dtype)
+    )
+    logger.info('Window has been loaded. DF shape: %s', df.shape)
+
+    idx, X = df.iloc[:, 0].values, df.iloc[:, 1:].values
+
+    logger.info(
+        'Dataset split into indexes and samples. '
+        'Index shape: %s. Samples shape: %s',
+        idx.shape, X.shape,
+    )
+
+    return idx, X, df
@@ -4,10 +4,60 @@ import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 
-from bitcoin_app.logging_config import logger_config
-
 logger = logging.getLogger(__name__)
-logger_config(logger)
+
+def scale(X: np.ndarray) -> tuple[StandardScaler, np.ndarray]:
+    """Dataset normalization.
+
+    :param X: Numpy array with values.
+    :type X: numpy.ndarray
+
+    :return: StandardScaler and normalized dataset
+    :rtype: tuple
+    """
+    scaler = StandardScaler()
+    X = scaler.fit_transform(X)
+
+    logger.info('Data scaled.')
+
+    return scaler, X
+
+
+def project(
+        X: np.ndarray,
+        pca_n_components: int,
+        pca_random_state: int,
+) -> tuple[PCA, np.ndarray]:
+    """PCA dimensional reduction of a normalized dataset.
+
+    :param X: normalized dataset.
+    :type X: numpy.ndarray
+    :param pca_n_components: the number of PCA components to be used for
+    dimensional reduction.
+    :type pca_n_components: int
+    :param pca_random_state: random state for PCA
+    :type pca_random_state: int
+
+    :return: PCA and first n principal components (float32)
+    :rtype: tuple
+    """
+    # Centering in place is only possible on a writable array
+    pca = PCA(
+        n_components=pca_n_components,
+        random_state=pca_random_state,
+        copy=not X.flags.writeable,
+    )
+
+    X = pca.fit_transform(X)
+    logger.info('PCA performed.')
+    logger.info('PCA Components: %s', pca.components_)
+    logger.info('PCA Explained Variance: %s', pca.explained_variance_ratio_)
+
+    # Contiguous memory layout and convert samples to float32
+    X = np.ascontiguousarray(X, dtype='float32')
+
+    return pca, X
+
 
 def data_processing(
         X: np.ndarray,
@@ -31,25 +81,30 @@ def data_processing(
 
     logger.info('Data preprocessing has been started.')
 
-    # Normalise dataset
-    scaler = StandardScaler()
-    X = scaler.fit_transform(X)
+    scaler, X = scale(X)
+    pca, X = project(X, pca_n_components, pca_random_state)
 
-    logger.info('Data scaled.')
+    return scaler, pca, X
 
-    # Apply PCA
-    pca = PCA(
-        n_components=pca_n_components,
-        random_state=pca_random_state,
-        copy=False,
-    )
 
-    X = pca.fit_transform(X)
-    logger.info('PCA performed.')
-    logger.info('PCA Components: %s', pca.components_)
-    logger.info('PCA Explained Variance: %s', pca.explained_variance_ratio_)
+def data_transform(
+        X: np.ndarray,
+        scaler: StandardScaler,
+        pca: PCA,
+) -> np.ndarray:
+    """Apply fitted normalization and PCA to a dataset.
 
-    # Contiguous memory layout and convert samples to float32
-    X = np.ascontiguousarray(X, dtype='float32')
+    :param X: Numpy array with values.
+    :type X: numpy.ndarray
+    :param scaler: fitted StandardScaler
+    :type scaler: StandardScaler
+    :param pca: fitted PCA
+    :type pca: PCA
 
-    return scaler, pca, X
+    :return: first n principal components
+    :rtype: numpy.ndarray
+    """
+    X = pca.transform(scaler.transform(X))
+    logger.info('Data scaled and projected with the fitted PCA.')
+
+    return np.ascontiguousarray(X, dtype='float32')
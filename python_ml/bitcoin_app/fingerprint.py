@@ -0,0 +1,33 @@
+"""Content fingerprints of arrays and settings."""
+import hashlib
+import json
+
+import numpy as np
+
+
+def array_fingerprint(X: np.ndarray, block_rows: int = 1 << 20) -> str:
+    """Hash of the shape, dtype and content of an array.
+
+    :param X: array to fingerprint.
+    :type X: numpy.ndarray
+    :param block_rows: number of rows hashed at once.
+    :type block_rows: int
+
+    :return: hex digest
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((X.shape, X.dtype.str)).encode())
+    for start in range(0, X.shape[0], block_rows):
+        digest.update(np.ascontiguousarray(X[start:start + block_rows]).data)
+    return digest.hexdigest()
+
+
+def value_fingerprint(*values) -> str:
+    """Hash of JSON-serializable values, e.g. settings dumps.
+
+    :return: hex digest
+    :rtype: str
+    """
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
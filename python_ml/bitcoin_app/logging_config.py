@@ -1,18 +1,30 @@
 import logging
 
+_configured = False
 
-def logger_config(logger):
-    """Set the logging level"""
-    logging.basicConfig(
-        filename='logging.log',
-        filemode='a',
-        format='%(asctime)s %(name)s %(levelname)s %(message)s',
-        level=logging.INFO
-    )
-    logger.setLevel(logging.INFO)
-    console_handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+
+def logger_config(logger=None):
+    """Set the logging level and handlers.
+
+    Logging is configured only once per process, no matter how many times
+    this is called: records go to `logging.log` and to a single console
+    handler on the root logger.
+    """
+    global _configured
+    if not _configured:
+        logging.basicConfig(
+            filename='logging.log',
+            filemode='a',
+            format='%(asctime)s %(name)s %(levelname)s %(message)s',
+            level=logging.INFO
+        )
+        console_handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        console_handler.setFormatter(formatter)
+        logging.getLogger().addHandler(console_handler)
+        _configured = True
+
+    if logger is not None:
+        logger.setLevel(logging.INFO)
 
     return logger
@@ -0,0 +1,200 @@
+"""Pipeline stages with cached outputs.
+
+The pipeline is load -> scale -> project (PCA) -> fit, where load reads
+lifetime features or sums the block height buckets of a window. The cache
+key of each stage is the hash of the key of its upstream stage and of its own
+settings, so changing a setting only recomputes the stages downstream of
+it: e.g. a new number of clusters reuses the loaded, scaled and
+projected dataset.
+"""
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from sklearn.decomposition import PCA
+    from sklearn.mixture import GaussianMixture
+    from sklearn.preprocessing import StandardScaler
+
+    from bitcoin_app.cache import StageCache
+    from bitcoin_app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def stage_cache(settings: Settings) -> StageCache | None:
+    """Returns the stage cache defined in the settings, None if disabled."""
+    if not settings.cache.enabled:
+        return None
+
+    from bitcoin_app.cache import StageCache
+
+    return StageCache(settings.cache.cache_dir, settings.cache.max_bytes)
+
+
+def _load_key(settings: Settings) -> str:
+    from bitcoin_app.cache import StageCache
+
+    dataset = settings.dataset
+    window = None
+    path = dataset.dataset_path
+    if dataset.window.enabled:
+        window = [dataset.bucket_size, dataset.window.model_dump()]
+        path = dataset.partitioned_path
+
+    # The file identity stands for its content, hashing it would cost as
+    # much as parsing it
+    path = path.resolve()
+    stat = path.stat()
+    return StageCache.key(
+        'load',
+        None,
+        [str(path), stat.st_size, stat.st_mtime_ns,
+         dataset.dtype, dataset.drop_na, window],
+    )
+
+
+def load_stage(
+        settings: Settings,
+        cache: StageCache | None,
+) -> tuple[str | None, np.ndarray, np.ndarray]:
+    """Load the dataset, summed over the block height window if one is set.
+
+    :return: stage key, entity ids and values
+    :rtype: tuple
+    """
+    from bitcoin_app.data_load import load_dataset, load_window
+
+    dataset = settings.dataset
+
+    def compute():
+        if dataset.window.enabled:
+            idx, X, _ = load_window(
+                path=dataset.partitioned_path,
+                dtype=dataset.dtype,
+                drop_na=dataset.drop_na,
+                bucket_size=dataset.bucket_size,
+                start=dataset.window.start,
+                end=dataset.window.end,
+                last_blocks=dataset.window.last_blocks,
+            )
+        else:
+            idx, X, _ = load_dataset(
+                path=dataset.dataset_path,
+                dtype=dataset.dtype,
+                drop_na=dataset.drop_na,
+            )
+        arrays = {
+            'idx': np.asarray(idx, dtype=np.int64),
+            'X': np.asarray(X, dtype=np.float64),
+        }
+        return arrays, None
+
+    if cache is None:
+        arrays, _ = compute()
+        return None, arrays['idx'], arrays['X']
+
+    key = _load_key(settings)
+    outputs = cache.cached(key, 'load', compute)
+    return key, outputs['idx'], outputs['X']
+
+
+def dataset_frame(
+        settings: Settings,
+        idx: np.ndarray,
+        X: np.ndarray,
+) -> pd.DataFrame:
+    """Rebuild the loaded DataFrame from the entity ids and values.
+
+    :return: dataset with the columns and data types of the settings
+    :rtype: pandas.DataFrame
+    """
+    import pandas as pd
+
+    cols = settings.dataset.cols
+    df = pd.DataFrame(X, columns=cols[1:])
+    df.insert(0, cols[0], idx)
+    return df.astype(settings.dataset.dtype)
+
+
+def preprocess_stages(
+        settings: Settings,
+        cache: StageCache | None,
+) -> tuple[np.ndarray, np.ndarray, StandardScaler, PCA, np.ndarray, str | None]:
+    """Load, scale and project the dataset.
+
+    :return: entity ids, values, scaler, PCA, principal components and the
+        key of the projection stage
+    :rtype: tuple
+    """
+    from bitcoin_app.data_processing import project, scale
+
+    load_key, idx, X = load_stage(settings, cache)
+
+    if cache is None:
+        scaler, X_scaled = scale(X)
+        pca, X_pca = project(
+            X_scaled,
+            settings.preprocessing.pca_n_components,
+            settings.preprocessing.pca_random_state,
+        )
+        return idx, X, scaler, pca, X_pca, None
+
+    def compute_scale():
+        scaler, X_scaled = scale(X)
+        return {'X': X_scaled}, {'scaler': scaler}
+
+    scale_key = cache.key('scale', load_key)
+    scaled = cache.cached(scale_key, 'scale', compute_scale)
+
+    def compute_project():
+        pca, X_pca = project(
+            scaled['X'],
+            settings.preprocessing.pca_n_components,
+            settings.preprocessing.pca_random_state,
+        )
+        return {'X': X_pca}, {'pca': pca}
+
+    pca_key = cache.key('pca', scale_key, settings.preprocessing.model_dump())
+    projected = cache.cached(pca_key, 'pca', compute_project)
+
+    return idx, X, scaled['scaler'], projected['pca'], projected['X'], pca_key
+
+
+def fit_stage(
+        settings: Settings,
+        X_pca: np.ndarray,
+        cache: StageCache | None,
+        upstream: str | None,
+) -> GaussianMixture:
+    """Fit the GaussianMixture on the principal components.
+
+    :return: fitted GaussianMixture
+    :rtype: GaussianMixture
+    """
+    from bitcoin_app.clustering import fit_gmm
+
+    clustering = settings.clustering
+
+    def compute():
+        gmm = fit_gmm(
+            X=X_pca,
+            n_components=clustering.n_components,
+            random_state=clustering.random_state,
+            engine=clustering.engine,
+            coreset=clustering.coreset if clustering.fit_mode == 'coreset' else None,
+        )
+        return {}, {'gmm': gmm}
+
+    if cache is None or upstream is None:
+        return compute()[1]['gmm']
+
+    fit_settings = clustering.model_dump(exclude={'model_folder', 'model_file'})
+    if clustering.fit_mode != 'coreset':
+        fit_settings.pop('coreset')
+    key = cache.key('fit', upstream, fit_settings)
+    return cache.cached(key, 'fit', compute)['gmm']
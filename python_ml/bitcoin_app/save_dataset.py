@@ -7,10 +7,7 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 
-from bitcoin_app.logging_config import logger_config
-
 logger = logging.getLogger(__name__)
-logger_config(logger)
 
 
 def save_dataset(
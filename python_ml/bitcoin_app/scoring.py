@@ -0,0 +1,115 @@
+"""Chunked, process-parallel cluster assignment."""
+import logging
+from pathlib import Path
+
+import numpy as np
+from sklearn.mixture import GaussianMixture
+
+logger = logging.getLogger(__name__)
+
+
+def _score_chunk(
+        gmm: GaussianMixture,
+        X: np.ndarray,
+        start: int,
+        stop: int,
+        labels: np.ndarray | None,
+        proba: np.ndarray | None,
+        labels_path: Path | None = None,
+        proba_path: Path | None = None,
+):
+    """Compute responsibilities of X[start:stop] once and write them out.
+
+    Worker processes receive the output paths and open the memory-mapped
+    arrays themselves; in-process calls write to the given arrays.
+    """
+    if labels is None:
+        labels = np.load(labels_path, mmap_mode='r+')
+        proba = np.load(proba_path, mmap_mode='r+')
+
+    _, log_resp = gmm._estimate_log_prob_resp(X[start:stop])
+    labels[start:stop] = log_resp.argmax(axis=1)
+    proba[start:stop] = np.exp(log_resp)
+
+    if isinstance(proba, np.memmap):
+        labels.flush()
+        proba.flush()
+
+
+def score_chunked(
+        gmm: GaussianMixture,
+        X: np.ndarray,
+        chunk_size: int,
+        n_jobs: int,
+        output_paths: tuple[Path, Path] | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Assign clusters and probabilities with one pass over row chunks.
+
+    Responsibilities are computed once per chunk; the argmax gives the
+    labels, so there is no second pass as with predict + predict_proba.
+    Probabilities are stored as float32. With `output_paths`, labels and
+    probabilities are written to memory-mapped `.npy` files, and chunks
+    are processed by `n_jobs` worker processes writing straight into them,
+    so peak memory stays bounded by the chunk size. Without them, worker
+    processes could not write into the in-memory arrays, so the chunks
+    are scored in this process and `n_jobs` is ignored.
+
+    :param gmm: fitted GaussianMixture
+    :type gmm: GaussianMixture
+    :param X: dataset
+    :type X: numpy.ndarray
+    :param chunk_size: number of rows per chunk.
+    :type chunk_size: int
+    :param n_jobs: number of worker processes, -1 for all cores, ignored
+        without `output_paths`.
+    :type n_jobs: int
+    :param output_paths: paths to the memory-mapped labels and
+        probabilities, in-memory if None.
+    :type output_paths: tuple
+
+    :return: clusters and prob distribution
+    :rtype: tuple
+    """
+    n_samples = X.shape[0]
+    starts = range(0, n_samples, chunk_size)
+
+    if output_paths is None:
+        labels = np.empty(n_samples, dtype=np.int32)
+        proba = np.empty((n_samples, gmm.n_components), dtype=np.float32)
+        for start in starts:
+            _score_chunk(gmm, X, start, start + chunk_size, labels, proba)
+        return labels, proba
+
+    labels_path, proba_path = (Path(path) for path in output_paths)
+    for path in (labels_path, proba_path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+    labels = np.lib.format.open_memmap(
+        labels_path, mode='w+', dtype=np.int32, shape=(n_samples,)
+    )
+    proba = np.lib.format.open_memmap(
+        proba_path, mode='w+', dtype=np.float32,
+        shape=(n_samples, gmm.n_components),
+    )
+
+    if n_jobs == 1:
+        for start in starts:
+            _score_chunk(gmm, X, start, start + chunk_size, labels, proba)
+    else:
+        from joblib import Parallel, delayed
+
+        del labels, proba
+        Parallel(n_jobs=n_jobs)(
+            delayed(_score_chunk)(
+                gmm, X, start, start + chunk_size, None, None,
+                labels_path, proba_path,
+            )
+            for start in starts
+        )
+        labels = np.load(labels_path, mmap_mode='r')
+        proba = np.load(proba_path, mmap_mode='r')
+
+    logger.info(
+        'Clusters and probabilities have been written to %s and %s',
+        labels_path, proba_path,
+    )
+    return labels, proba
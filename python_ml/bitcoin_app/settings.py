@@ -1,17 +1,53 @@
 """Application Settings."""
 
 from pathlib import Path
+from typing import Literal
 
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from bitcoin_app import module_root
 
 
+class WindowSettings(BaseSettings):
+    """Block height window of the entity features, lifetime totals if unset,
+    WINDOW_* environment variables."""
+    model_config = SettingsConfigDict(env_prefix='WINDOW_')
+
+    start: int | None = None        # first block height
+    end: int | None = None          # block height after the window
+    last_blocks: int | None = None  # or the last blocks of the data
+
+    @property
+    def enabled(self) -> bool:
+        """Returns True if a window is set."""
+        return any(
+            value is not None
+            for value in (self.start, self.end, self.last_blocks)
+        )
+
+    @property
+    def tag(self) -> str:
+        """Returns a short name of the window for file names."""
+        if self.last_blocks is not None:
+            return f'last{self.last_blocks}'
+        return f'h{self.start or 0}-{"" if self.end is None else self.end}'
+
+    def tag_path(self, path: Path) -> Path:
+        """Returns the path with the window tag in its name, if a window is set."""
+        if not self.enabled:
+            return path
+        return path.with_name(f'{path.stem}_{self.tag}{path.suffix}')
+
+
 class DatasetSettings(BaseSettings):
     """Dataset Load settings"""
     dataset_folder: str = 'dataset'
     dataset_file: str = 'entity_features_final.csv' # "entity_features_small.csv" entity_features_final
     dataset_save_file: str = 'dataset_pca_clusters.csv'
+    # Features per entity and block height bucket, read when a window is set
+    partitioned_file: str = 'entity_features_by_height.csv'
+    bucket_size: int = 2016
+    window: WindowSettings = WindowSettings()
     drop_na: bool = True
     cols: list = [
         "ENTITY_ID", "TOTAL_RECIEVE_ADDRESSES", "TOTAL_RECIEVE_TRANSACTIONS",
@@ -33,10 +69,17 @@ class DatasetSettings(BaseSettings):
         """Returns the path to the dataset file."""
         return module_root / ".." / self.dataset_folder / self.dataset_file
 
+    @property
+    def partitioned_path(self) -> Path:
+        """Returns the path to the features partitioned by block height."""
+        return module_root / ".." / self.dataset_folder / self.partitioned_file
+
     @property
     def dataset_save_path(self) -> Path:
-        """Returns the path to the dataset file."""
-        return module_root / ".." / self.dataset_folder / self.dataset_save_file
+        """Returns the path to the dataset file, tagged with the window."""
+        return self.window.tag_path(
+            module_root / ".." / self.dataset_folder / self.dataset_save_file
+        )
 
 
 class PreprocessingSettings(BaseSettings):
@@ -47,21 +90,150 @@ class PreprocessingSettings(BaseSettings):
 
 class FindClustersSettings(BaseSettings):
     """Settings for the search of the optimal number of the clusters."""
-    n_components: tuple[int, int] = 3, 30
+    # min, max (excluded) and optional step
+    n_components: tuple[int, ...] = 3, 30
     random_state: int = 0
+    n_seeds: int = 1
     verbose: bool = True
     plot_filename: str = 'clusters_AIC_BIC_Sil.png'
+    checkpoint: bool = True
+    checkpoint_filename: str = 'sweep_checkpoint.jsonl'
 
     @property
     def plot_path(self) -> Path:
         """Returns the path to the clustering plot."""
         return module_root / ".." / self.plot_filename
 
+    @property
+    def checkpoint_path(self) -> Path | None:
+        """Returns the path to the sweep checkpoint, None if disabled."""
+        if not self.checkpoint:
+            return None
+        return module_root / ".." / self.checkpoint_filename
+
+
+class MixtureEngineSettings(BaseSettings):
+    """GaussianMixture engine settings, ENGINE_* environment variables."""
+    model_config = SettingsConfigDict(env_prefix='ENGINE_')
+
+    covariance_type: Literal['full', 'diag', 'tied', 'spherical'] = 'full'
+    dtype: Literal['float64', 'float32'] = 'float64'
+    n_threads: int = 1          # E-step threads, -1 for all cores
+    chunk_size: int = 65536     # E-step rows per chunk
+    n_init: int = 1             # initializations, the best one is kept
+    init_n_jobs: int = -1       # processes running the initializations
+    tol: float = 1e-3
+    max_iter: int = 100
+
+
+class CoresetSettings(BaseSettings):
+    """Settings of the coreset fitting mode, CORESET_* environment variables."""
+    model_config = SettingsConfigDict(env_prefix='CORESET_')
+
+    sample_size: int = 200000
+    random_state: int | None = None  # sampling, the clustering one if None
+    n_bins: int = 32                # bins per principal component
+    min_per_cell: int = 5
+    validation_size: int = 100000
+    compare_full_fit: bool = False  # also fit on all rows to report the gap
+
 
 class ClusteringSettings(BaseSettings):
     """"Clustering Settings."""
     n_components: int = 12
     random_state: int = 0
+    engine: MixtureEngineSettings = MixtureEngineSettings()
+    fit_mode: Literal['full', 'coreset'] = 'full'
+    coreset: CoresetSettings = CoresetSettings()
+    model_folder: str = 'dataset'
+    model_file: str = 'gmm_model.joblib'
+
+    @property
+    def model_path(self) -> Path:
+        """Returns the path to the fitted scaler, PCA and GaussianMixture."""
+        return module_root / ".." / self.model_folder / self.model_file
+
+
+class ScoringSettings(BaseSettings):
+    """Settings of the cluster assignment."""
+    n_jobs: int = -1            # worker processes, -1 for all cores
+    chunk_size: int = 262144    # rows scored at once
+    output_folder: str = 'dataset'
+    labels_file: str = 'clusters.npy'
+    proba_file: str = 'clusters_proba.npy'
+
+    @property
+    def labels_path(self) -> Path:
+        """Returns the path to the memory-mapped clusters."""
+        return module_root / ".." / self.output_folder / self.labels_file
+
+    @property
+    def proba_path(self) -> Path:
+        """Returns the path to the memory-mapped probabilities."""
+        return module_root / ".." / self.output_folder / self.proba_file
+
+
+class ExportSettings(BaseSettings):
+    """Settings for the export to the dashboard backend."""
+    backend_folder: str = '../viz/dash/backend'
+    export_file: str = 'dataset_pca_clusters_sample.csv'
+    sample_size: int | None = None
+    random_state: int = 0
+
+    @property
+    def export_path(self) -> Path:
+        """Returns the path to the dataset imported by the dashboard."""
+        return module_root / ".." / self.backend_folder / "data" / self.export_file
+
+    @property
+    def import_script_path(self) -> Path:
+        """Returns the path to the dashboard import script."""
+        return module_root / ".." / self.backend_folder / "app" / "import_data.py"
+
+
+class CacheSettings(BaseSettings):
+    """Settings of the on-disk cache of the pipeline stages, CACHE_*
+    environment variables."""
+    model_config = SettingsConfigDict(env_prefix='CACHE_')
+
+    enabled: bool = True
+    cache_folder: str = '.cache/stages'
+    max_bytes: int = 20 * 1024 ** 3    # least recently used entries evicted over it
+
+    @property
+    def cache_dir(self) -> Path:
+        """Returns the folder of the stage cache."""
+        return module_root / ".." / self.cache_folder
+
+
+class BlocksSettings(BaseSettings):
+    """Settings of the block level analytics."""
+    # blocks, txs and txouts columns (.npy), or their CSV exports
+    blocks_folder: str = 'dataset/blocks'
+    rolling_window: int = 144   # blocks, about a day
+    metrics_file: str = 'block_metrics.csv'
+    rolling_file: str = 'block_rolling.csv'
+    buckets_file: str = 'block_buckets.csv'
+
+    @property
+    def blocks_dir(self) -> Path:
+        """Returns the folder of the block, transaction and output columns."""
+        return module_root / ".." / self.blocks_folder
+
+    @property
+    def metrics_path(self) -> Path:
+        """Returns the path to the per block metrics."""
+        return self.blocks_dir / self.metrics_file
+
+    @property
+    def rolling_path(self) -> Path:
+        """Returns the path to the rolling statistics."""
+        return self.blocks_dir / self.rolling_file
+
+    @property
+    def buckets_path(self) -> Path:
+        """Returns the path to the per height bucket summary."""
+        return self.blocks_dir / self.buckets_file
 
 
 class Settings(BaseSettings):
@@ -70,5 +242,24 @@ class Settings(BaseSettings):
     preprocessing: PreprocessingSettings = PreprocessingSettings()
     find_clusters: FindClustersSettings = FindClustersSettings()
     clustering: ClusteringSettings = ClusteringSettings()
+    scoring: ScoringSettings = ScoringSettings()
+    export: ExportSettings = ExportSettings()
+    cache: CacheSettings = CacheSettings()
+    blocks: BlocksSettings = BlocksSettings()
 
     find_clustering: bool = False
+
+    @property
+    def model_path(self) -> Path:
+        """Returns the path to the model, tagged with the dataset window."""
+        return self.dataset.window.tag_path(self.clustering.model_path)
+
+    @property
+    def scoring_paths(self) -> tuple[Path, Path]:
+        """Returns the paths to the clusters and probabilities, tagged with
+        the dataset window."""
+        window = self.dataset.window
+        return (
+            window.tag_path(self.scoring.labels_path),
+            window.tag_path(self.scoring.proba_path),
+        )
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from bitcoin_app.coreset import stratified_coreset
+
+
+def heavy_tailed(n_samples, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.lognormal(0, 3, size=(n_samples, 3)) * rng.choice([-1, 1], size=(n_samples, 3))
+
+
+@pytest.mark.parametrize('sample_size', [100, 3000, 20000])
+def test_coreset_size_within_budget(sample_size):
+    X = heavy_tailed(100000)
+    idx, weights = stratified_coreset(
+        X, sample_size=sample_size, n_bins=32, min_per_cell=5, random_state=0,
+    )
+    assert len(idx) <= sample_size
+    assert len(np.unique(idx)) == len(idx)
+    assert np.all(weights > 0)
+
+
+def test_coreset_weights_sum_to_rows():
+    X = heavy_tailed(50000)
+    idx, weights = stratified_coreset(
+        X, sample_size=20000, n_bins=8, min_per_cell=5, random_state=0,
+    )
+    assert len(idx) == 20000
+    assert weights.sum() == pytest.approx(len(X))
+
+
+def test_coreset_keeps_all_rows_over_budget():
+    X = heavy_tailed(1000)
+    idx, weights = stratified_coreset(
+        X, sample_size=5000, n_bins=32, min_per_cell=5, random_state=0,
+    )
+    np.testing.assert_array_equal(idx, np.arange(len(X)))
+    np.testing.assert_array_equal(weights, 1.0)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from sklearn.mixture import GaussianMixture
+
+from bitcoin_app.mixture import ChunkedGaussianMixture
+
+pytestmark = pytest.mark.filterwarnings('ignore::sklearn.exceptions.ConvergenceWarning')
+
+
+def blobs(n_samples, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.array([[0, 0, 0], [4, 4, 0], [-4, 2, 3]])
+    labels = rng.integers(len(centers), size=n_samples)
+    return centers[labels] + rng.normal(size=(n_samples, 3))
+
+
+@pytest.mark.parametrize('covariance_type', ['full', 'diag', 'tied', 'spherical'])
+def test_weighted_em_matches_duplicated_rows(covariance_type):
+    X = blobs(600)
+    weights = np.random.default_rng(1).integers(1, 4, size=len(X))
+    # Same starting point for both fits, kmeans would see different data
+    init = GaussianMixture(3, covariance_type=covariance_type, max_iter=1, random_state=0).fit(X)
+    params = dict(
+        n_components=3,
+        covariance_type=covariance_type,
+        weights_init=init.weights_,
+        means_init=init.means_,
+        precisions_init=init.precisions_,
+        tol=1e-10,
+        max_iter=20,
+        chunk_size=100,
+        n_threads=2,
+    )
+
+    weighted = ChunkedGaussianMixture(**params).fit(X, sample_weight=weights)
+    duplicated = ChunkedGaussianMixture(**params).fit(np.repeat(X, weights, axis=0))
+
+    np.testing.assert_allclose(weighted.weights_, duplicated.weights_, rtol=1e-6)
+    np.testing.assert_allclose(weighted.means_, duplicated.means_, rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(weighted.covariances_, duplicated.covariances_, rtol=1e-6, atol=1e-9)
+    assert weighted.lower_bound_ == pytest.approx(duplicated.lower_bound_, rel=1e-8)
+
+
+def test_chunked_fit_matches_gaussian_mixture():
+    X = blobs(5000)
+    reference = GaussianMixture(3, random_state=0).fit(X)
+    chunked = ChunkedGaussianMixture(
+        3, random_state=0, dtype='float64', chunk_size=512, n_threads=2,
+    ).fit(X)
+
+    assert chunked.n_iter_ == reference.n_iter_
+    assert chunked.lower_bound_ == pytest.approx(reference.lower_bound_, rel=1e-10)
+    np.testing.assert_allclose(chunked.means_, reference.means_, rtol=1e-8)
@@ -0,0 +1,220 @@
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+ENTITY_COLUMNS = [
+    'entity_id',
+    'total_receive_addresses',
+    'total_receive_transactions',
+    'total_btc_received',
+    'total_spend_addresses',
+    'total_spend_transactions',
+    'total_btc_spent',
+    'pc1', 'pc2', 'pc3',
+    'cluster',
+] + [f'cluster_{i}' for i in range(1, 13)]
+
+# Columns returned by /api/cluster/{cluster_id}
+CLUSTER_ENTITY_COLUMNS = [
+    'entity_id',
+    'total_btc_received',
+    'total_btc_spent',
+    'total_receive_transactions',
+    'total_spend_transactions',
+    'pc1', 'pc2', 'pc3',
+    'cluster',
+] + [f'cluster_{i}' for i in range(1, 13)]
+
+INTEGER_COLUMNS = {
+    'entity_id',
+    'total_receive_addresses',
+    'total_receive_transactions',
+    'total_spend_addresses',
+    'total_spend_transactions',
+    'cluster',
+}
+
+
+def write_snapshot(conn, snapshot_dir, chunk_size=100000):
+    """Write entity_clusters as one .npy file per column, sorted by entity_id.
+
+    Next to the columns, the snapshot holds a per-cluster ordering by
+    total_btc_received (descending) so cluster pages are plain slices, and
+    the progressive ordering by sample_rank streamed to the 3D view.
+    The snapshot is written to a temporary directory and renamed into place.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    tmp_dir = snapshot_dir.with_name(snapshot_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    n_rows = conn.execute('SELECT COUNT(*) FROM entity_clusters').fetchone()[0]
+    arrays = {
+        col: np.lib.format.open_memmap(
+            tmp_dir / f'{col}.npy',
+            mode='w+',
+            dtype=np.int64 if col in INTEGER_COLUMNS else np.float64,
+            shape=(n_rows,),
+        )
+        for col in ENTITY_COLUMNS
+    }
+
+    cursor = conn.execute(
+        f"SELECT {', '.join(ENTITY_COLUMNS)} FROM entity_clusters ORDER BY entity_id"
+    )
+    start = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk = np.array(rows, dtype=np.float64)
+        for i, col in enumerate(ENTITY_COLUMNS):
+            arrays[col][start:start + len(rows)] = chunk[:, i]
+        start += len(rows)
+
+    # Per-cluster order by BTC received, largest first
+    cluster = arrays['cluster']
+    order = np.lexsort((-arrays['total_btc_received'], cluster))
+    clusters = np.unique(cluster)
+    offsets = np.searchsorted(cluster[order], clusters, side='left')
+    np.save(tmp_dir / 'cluster_order.npy', order)
+    np.save(tmp_dir / 'cluster_ids.npy', clusters)
+    np.save(tmp_dir / 'cluster_offsets.npy', np.append(offsets, n_rows))
+
+    # Progressive order, as rows of the snapshot
+    progressive = np.lib.format.open_memmap(
+        tmp_dir / 'progressive_order.npy', mode='w+', dtype=np.int64, shape=(n_rows,)
+    )
+    cursor = conn.execute(
+        'SELECT entity_id FROM entity_clusters ORDER BY sample_rank, entity_id'
+    )
+    start = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        ids = np.array(rows, dtype=np.int64).ravel()
+        progressive[start:start + len(rows)] = np.searchsorted(arrays['entity_id'], ids)
+        start += len(rows)
+    progressive.flush()
+    del progressive
+
+    for array in arrays.values():
+        array.flush()
+    del arrays
+
+    with open(tmp_dir / 'snapshot.json', 'w') as f:
+        json.dump({'rows': int(n_rows), 'columns': ENTITY_COLUMNS}, f)
+
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    tmp_dir.rename(snapshot_dir)
+    return n_rows
+
+
+class ColumnarStore:
+    """Read-only entity_clusters served from a memory-mapped snapshot.
+
+    Answers the API queries with NumPy over the mapped columns instead of
+    going through SQL: entity lookup is a binary search on the sorted ids,
+    cluster pages are slices of a precomputed order and aggregates are
+    computed once and cached, since the snapshot never changes.
+    """
+
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = Path(snapshot_dir)
+        with open(self.snapshot_dir / 'snapshot.json') as f:
+            meta = json.load(f)
+        self.rows = meta['rows']
+        self.columns = {
+            col: np.load(self.snapshot_dir / f'{col}.npy', mmap_mode='r')
+            for col in meta['columns']
+        }
+        self.cluster_order = np.load(self.snapshot_dir / 'cluster_order.npy', mmap_mode='r')
+        self.cluster_ids = np.load(self.snapshot_dir / 'cluster_ids.npy')
+        self.cluster_offsets = np.load(self.snapshot_dir / 'cluster_offsets.npy')
+        self.progressive_order = np.load(
+            self.snapshot_dir / 'progressive_order.npy', mmap_mode='r'
+        )
+        self._rng = np.random.default_rng()
+        self._cluster_stats = None
+        self._visualization_stats = None
+
+    def _records(self, rows, columns=ENTITY_COLUMNS):
+        values = [self.columns[col][rows].tolist() for col in columns]
+        return [dict(zip(columns, record)) for record in zip(*values)]
+
+    def entity(self, entity_id):
+        ids = self.columns['entity_id']
+        row = int(np.searchsorted(ids, entity_id))
+        if row == self.rows or ids[row] != entity_id:
+            return None
+        return self._records([row])[0]
+
+    def sample(self, sample_size):
+        size = min(max(sample_size, 0), self.rows)
+        rows = np.sort(self._rng.choice(self.rows, size=size, replace=False))
+        records = self._records(rows)
+        self._rng.shuffle(records)
+        return records
+
+    def progressive(self, start, size):
+        """Rows [start, start + size) of the progressive sample"""
+        return self._records(self.progressive_order[start:start + size])
+
+    def cluster_entities(self, cluster_id, limit, offset):
+        i = int(np.searchsorted(self.cluster_ids, cluster_id))
+        if i == len(self.cluster_ids) or self.cluster_ids[i] != cluster_id:
+            return []
+        start = self.cluster_offsets[i] + max(offset, 0)
+        stop = min(start + max(limit, 0), self.cluster_offsets[i + 1])
+        return self._records(self.cluster_order[start:stop], CLUSTER_ENTITY_COLUMNS)
+
+    def cluster_stats(self):
+        if self._cluster_stats is None:
+            cols = self.columns
+            _, inverse, counts = np.unique(
+                cols['cluster'], return_inverse=True, return_counts=True
+            )
+
+            def avg(col):
+                return np.bincount(inverse, weights=cols[col]) / counts
+
+            def max_(col):
+                out = np.full(len(counts), -np.inf)
+                np.maximum.at(out, inverse, cols[col])
+                return out
+
+            stats = {
+                'cluster': self.cluster_ids,
+                'count': counts,
+                'avg_btc_received': avg('total_btc_received'),
+                'max_btc_received': max_('total_btc_received'),
+                'avg_btc_spent': avg('total_btc_spent'),
+                'max_btc_spent': max_('total_btc_spent'),
+                'avg_receive_transactions': avg('total_receive_transactions'),
+                'avg_spend_transactions': avg('total_spend_transactions'),
+                'avg_pc1': avg('pc1'),
+                'avg_pc2': avg('pc2'),
+                'avg_pc3': avg('pc3'),
+            }
+            keys = list(stats)
+            self._cluster_stats = [
+                dict(zip(keys, record))
+                for record in zip(*(stats[key].tolist() for key in keys))
+            ]
+        return self._cluster_stats
+
+    def visualization_stats(self):
+        if self._visualization_stats is None:
+            cols = self.columns
+            stats = {}
+            for pc in ('pc1', 'pc2', 'pc3'):
+                stats[f'min_{pc}'] = float(cols[pc].min())
+                stats[f'max_{pc}'] = float(cols[pc].max())
+            stats['num_clusters'] = len(self.cluster_ids)
+            stats['min_btc'] = float(cols['total_btc_received'].min())
+            stats['max_btc'] = float(cols['total_btc_received'].max())
+            self._visualization_stats = stats
+        return self._visualization_stats
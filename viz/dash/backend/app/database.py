@@ -1,33 +1,189 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from databases import Database
+import asyncio
+import json
 import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 from dotenv import load_dotenv
+from sqlalchemy.ext.declarative import declarative_base
 
 load_dotenv()
 
+APP_DIR = Path(__file__).parent
+
 # Use the absolute path to your SQLite database
-DATABASE_URL = "sqlite:///./bitcoin_clusters.db"
+DATABASE_PATH = Path(os.getenv("DATABASE_PATH", APP_DIR / "bitcoin_clusters.db"))
 
-# SQLAlchemy engine for sync operations
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Serving configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", os.cpu_count() or 4))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 30000000000))
+API_WORKERS = int(os.getenv("API_WORKERS", 1))
 
-# Database instance for async operations
-database = Database(DATABASE_URL)
+# "sqlite" (default) or "columnar" to serve from the memory-mapped snapshot
+API_BACKEND = os.getenv("API_BACKEND", "sqlite")
+SNAPSHOT_PATH = Path(os.getenv("SNAPSHOT_PATH", APP_DIR / "snapshot"))
 
-# SessionLocal class for sync operations when needed
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# public_key_uuid -> entity_id index built by key_index.py
+KEY_INDEX_PATH = Path(os.getenv("KEY_INDEX_PATH", APP_DIR / "public_keys.idx"))
+
+# import_data.py builds every import as a new version in VERSIONS_DIR and
+# publishes it by atomically replacing the CURRENT_PATH pointer file; the
+# API polls the pointer every DB_RELOAD_INTERVAL seconds and switches to
+# the new version. Without a pointer, DATABASE_PATH and SNAPSHOT_PATH are
+# served as they are.
+CURRENT_PATH = Path(os.getenv("CURRENT_PATH", APP_DIR / "current.json"))
+VERSIONS_DIR = Path(os.getenv("VERSIONS_DIR", APP_DIR / "versions"))
+DB_KEEP_VERSIONS = int(os.getenv("DB_KEEP_VERSIONS", 2))
+DB_RELOAD_INTERVAL = float(os.getenv("DB_RELOAD_INTERVAL", 5))
 
 # Base class for SQLAlchemy models
 Base = declarative_base()
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
+
+def current_version():
+    """Return the published {version, database, snapshot}"""
     try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+        data = json.loads(CURRENT_PATH.read_text())
+    except FileNotFoundError:
+        return {"version": None, "database": DATABASE_PATH, "snapshot": SNAPSHOT_PATH}
+    return {
+        "version": data["version"],
+        "database": CURRENT_PATH.parent / data["database"],
+        "snapshot": CURRENT_PATH.parent / data["snapshot"],
+    }
+
+
+def publish_version(version, database_path, snapshot_path):
+    """Atomically point readers to a new database version"""
+    data = {
+        "version": version,
+        "database": os.path.relpath(database_path, CURRENT_PATH.parent),
+        "snapshot": os.path.relpath(snapshot_path, CURRENT_PATH.parent),
+    }
+    # One temporary file per process, so concurrent imports never share it
+    tmp_path = CURRENT_PATH.with_name(f"{CURRENT_PATH.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CURRENT_PATH)
+
+
+def connect_readonly(path=DATABASE_PATH):
+    """Open a read-only, immutable SQLite connection with mmap enabled"""
+    uri = f"{Path(path).resolve().as_uri()}?mode=ro&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+    conn.execute('PRAGMA query_only = ON')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+
+class _Generation:
+    """Connections to one database version"""
+
+    def __init__(self, path, size, version=None):
+        self.path = Path(path)
+        self.version = version
+        self.retired = False
+        self.connections = queue.Queue()
+        for _ in range(size):
+            self.connections.put(connect_readonly(self.path))
+
+    def close_idle(self):
+        while not self.connections.empty():
+            self.connections.get_nowait().close()
+
+
+class ReadOnlyPool:
+    """Pool of read-only SQLite connections served from a thread pool.
+
+    Queries run on worker threads so the event loop never blocks, and
+    SQLite releases the GIL while executing, so concurrent requests are
+    answered in parallel instead of queueing on a single connection.
+    The executor has exactly one thread per connection, so a thread never
+    waits for a connection to become free.
+
+    `switch` moves the pool to another database file without dropping
+    requests: new queries get connections to the new file, while running
+    ones finish on the old connections, which are closed when returned.
+    Without a path, the published version is served.
+    """
+
+    def __init__(self, path=None, size=DB_POOL_SIZE):
+        self._path = None if path is None else Path(path)
+        self.size = max(1, size)
+        self._generation = None
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def path(self):
+        if self._generation is None:
+            return self._path or current_version()["database"]
+        return self._generation.path
+
+    @property
+    def version(self):
+        return None if self._generation is None else self._generation.version
+
+    async def connect(self):
+        if self._path is None:
+            current = current_version()
+            self._generation = _Generation(current["database"], self.size, current["version"])
+        else:
+            self._generation = _Generation(self._path, self.size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.size, thread_name_prefix="sqlite-ro"
+        )
+
+    async def switch(self, path, version=None):
+        """Serve another database file from now on"""
+        # Opening and warming up the connections reads the file, so it runs
+        # on the executor; only the swap runs on the event loop
+        loop = asyncio.get_running_loop()
+        generation = await loop.run_in_executor(
+            self._executor, _Generation, path, self.size, version
+        )
+        with self._lock:
+            previous, self._generation = self._generation, generation
+            previous.retired = True
+            previous.close_idle()
+
+    async def disconnect(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._generation is not None:
+            self._generation.close_idle()
+
+    def _execute(self, fetch, query, values):
+        # The generation has one connection per executor thread, so get()
+        # never blocks while the lock is held
+        with self._lock:
+            generation = self._generation
+            conn = generation.connections.get()
+        try:
+            return fetch(conn.execute(query, values or {}))
+        finally:
+            with self._lock:
+                if generation.retired:
+                    conn.close()
+                else:
+                    generation.connections.put(conn)
+
+    async def _run(self, fetch, query, values):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._execute, fetch, query, values
+        )
+
+    async def fetch_all(self, query, values=None):
+        return await self._run(sqlite3.Cursor.fetchall, query, values)
+
+    async def fetch_one(self, query, values=None):
+        return await self._run(sqlite3.Cursor.fetchone, query, values)
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+
+from columnar import INTEGER_COLUMNS
+from database import connect_readonly
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back in chunks"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _chunks(db_path, query, values, chunk_size):
+    """Yield (columns, rows) chunks from a server-side cursor.
+
+    A dedicated read-only connection is used so long exports do not hold
+    a connection of the request pool.
+    """
+    conn = connect_readonly(db_path)
+    try:
+        cursor = conn.execute(query, values)
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield columns, rows
+    finally:
+        conn.close()
+
+
+def _ndjson(chunks):
+    for columns, rows in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(columns, row))) + '\n' for row in rows
+        ).encode()
+
+
+def _csv(chunks):
+    header = True
+    for columns, rows in chunks:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(columns)
+            header = False
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+
+
+def _parquet(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for columns, rows in chunks:
+        if writer is None:
+            schema = pa.schema([
+                (col, pa.int64() if col in INTEGER_COLUMNS else pa.float64())
+                for col in columns
+            ])
+            writer = pq.ParquetWriter(sink, schema)
+        # One row group per chunk
+        table = pa.Table.from_arrays(
+            [pa.array(values, type=field.type)
+             for values, field in zip(zip(*rows), schema)],
+            schema=schema,
+        )
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def stream_export(db_path, query, values, fmt, chunk_size=10000):
+    """Stream the result of `query` encoded as NDJSON, CSV or Parquet.
+
+    Only one chunk of rows is materialized at a time, so memory per request
+    stays constant regardless of the export size. The generator is pulled
+    by the response as the client consumes it, which gives backpressure.
+    """
+    encoders = {'ndjson': _ndjson, 'csv': _csv, 'parquet': _parquet}
+    return encoders[fmt](_chunks(db_path, query, values, chunk_size))
@@ -1,12 +1,19 @@
 import pandas as pd
+import shutil
 import sqlite3
 import os
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 import numpy as np
 from tqdm import tqdm
 import gc
 import csv  # Added for debugging
+import json
+
+from columnar import write_snapshot
+from database import DB_KEEP_VERSIONS, VERSIONS_DIR, current_version, publish_version
+from sketches import sketch_chunk, store_sketches
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +23,7 @@ def create_database_schema(conn):
     print("Creating database schema...")
     
     conn.execute('DROP TABLE IF EXISTS entity_clusters')
+    conn.execute('DROP TABLE IF EXISTS cluster_distributions')
     conn.execute('''
     CREATE TABLE entity_clusters (
         entity_id INTEGER PRIMARY KEY,
@@ -40,7 +48,8 @@ def create_database_schema(conn):
         cluster_9 REAL,
         cluster_10 REAL,
         cluster_11 REAL,
-        cluster_12 REAL
+        cluster_12 REAL,
+        sample_rank REAL
     )
     ''')
     
@@ -54,6 +63,26 @@ def optimize_sqlite_connection(conn):
     conn.execute('PRAGMA temp_store = MEMORY')
     conn.execute('PRAGMA mmap_size = 30000000000')
 
+def assign_sample_ranks(conn):
+    """Rank every entity at random within its cluster, scaled to (0, 1).
+
+    Reading rows by increasing sample_rank yields a sample stratified by
+    cluster at every prefix, which /api/cluster-data/stream sends in
+    coarse-to-fine batches.
+    """
+    conn.execute('''
+    UPDATE entity_clusters
+    SET sample_rank = ranked.sample_rank
+    FROM (
+        SELECT
+            entity_id,
+            (ROW_NUMBER() OVER (PARTITION BY cluster ORDER BY RANDOM()) - 0.5)
+                / COUNT(*) OVER (PARTITION BY cluster) AS sample_rank
+        FROM entity_clusters
+    ) AS ranked
+    WHERE entity_clusters.entity_id = ranked.entity_id
+    ''')
+
 def insert_records(conn, df, batch_size=100):
     """Insert records in small batches"""
     
@@ -79,18 +108,90 @@ def insert_records(conn, df, batch_size=100):
                 print(f"First row of failing batch: {batch[0]}")
             raise
 
+def verify_database(db_path, snapshot_path, expected_rows, expected_sketches):
+    """Check a freshly built version before it is published"""
+    print("\nVerifying database...")
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        errors = []
+        integrity = conn.execute('PRAGMA quick_check').fetchone()[0]
+        if integrity != 'ok':
+            errors.append(f"quick_check: {integrity}")
+
+        rows = conn.execute('SELECT COUNT(*) FROM entity_clusters').fetchone()[0]
+        if rows != expected_rows:
+            errors.append(f"{rows:,} rows in entity_clusters, {expected_rows:,} imported")
+
+        sketches = conn.execute('SELECT COUNT(*) FROM cluster_distributions').fetchone()[0]
+        if sketches != expected_sketches:
+            errors.append(f"{sketches} distribution sketches, {expected_sketches} expected")
+
+        indices = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        unranked = conn.execute('SELECT COUNT(*) FROM entity_clusters WHERE sample_rank IS NULL').fetchone()[0]
+        if unranked:
+            errors.append(f"{unranked:,} rows without sample_rank")
+
+        for index in ('idx_pc_coords', 'idx_main_cluster', 'idx_cluster_probs', 'idx_sample_rank'):
+            if index not in indices:
+                errors.append(f"missing index {index}")
+    finally:
+        conn.close()
+
+    snapshot_rows = json.loads((Path(snapshot_path) / 'snapshot.json').read_text())['rows']
+    if snapshot_rows != expected_rows:
+        errors.append(f"{snapshot_rows:,} rows in the columnar snapshot, {expected_rows:,} imported")
+
+    if errors:
+        raise RuntimeError("Verification failed: " + "; ".join(errors))
+    print(f"Verification passed: {rows:,} rows, {sketches} sketches")
+
+
+def prune_versions(keep=DB_KEEP_VERSIONS):
+    """Delete all but the `keep` newest versions, never the published one.
+
+    Servers still reading a deleted version keep their open files until
+    they switch, so this never breaks running queries.
+    """
+    current = current_version()["database"].resolve()
+    versions = sorted(VERSIONS_DIR.glob('bitcoin_clusters-*.db'), reverse=True)
+    for db_path in versions[keep:]:
+        if db_path.resolve() == current:
+            continue
+        version = db_path.stem[len('bitcoin_clusters-'):]
+        print(f"Removing version {version}")
+        # On Windows, files still open in a server cannot be deleted; they
+        # are then left for the next import to prune
+        snapshot_path = VERSIONS_DIR / f"snapshot-{version}"
+        try:
+            if snapshot_path.exists():
+                shutil.rmtree(snapshot_path)
+            db_path.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"Could not remove version {version}, still in use? {e}")
+
+
 def import_data_to_sqlite():
     current_file = Path(__file__)
     app_dir = current_file.parent
     project_root = app_dir.parent
     data_dir = project_root / "data"
-    db_path = app_dir / "bitcoin_clusters.db"
+    # Every import is a new version built on the side, so servers keep
+    # reading the published one until the new one is verified and published
+    # Microseconds and the process id keep concurrent imports apart, and the
+    # names still sort by time for prune_versions
+    now = time.time()
+    version = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1e6) % 1000000:06d}-{os.getpid()}"
+    VERSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    db_path = VERSIONS_DIR / f"bitcoin_clusters-{version}.db"
+    snapshot_path = VERSIONS_DIR / f"snapshot-{version}"
+    if db_path.exists() or snapshot_path.exists():
+        raise FileExistsError(f"Version {version} already exists")
     csv_path = data_dir / "dataset_pca_clusters_sample.csv"
 
     print(f"\nProject structure:")
     print(f"- Project root: {project_root}")
     print(f"- Data directory: {data_dir}")
-    print(f"- Database will be created at: {db_path}")
+    print(f"- Database version {version} will be created at: {db_path}")
     print(f"- Looking for CSV at: {csv_path}")
 
     if not csv_path.exists():
@@ -103,7 +204,8 @@ def import_data_to_sqlite():
         print(f"First line preview: {first_line[:50]}")
 
     conn = sqlite3.connect(str(db_path))
-    
+    imported_rows = 0
+
     try:
         optimize_sqlite_connection(conn)
         create_database_schema(conn)
@@ -135,6 +237,9 @@ def import_data_to_sqlite():
         for i in range(1, 13):
             dtypes[f'Cluster_{i}'] = np.float64
 
+        # Per cluster and feature distribution sketches
+        sketches = {}
+
         with tqdm(total=total_rows, desc="Importing data") as pbar:
             # reading files 
             try:
@@ -165,11 +270,13 @@ def import_data_to_sqlite():
                     
                     # Insert records in batches
                     insert_records(conn, chunk, batch_size)
+                    sketch_chunk(sketches, chunk)
                     
                     # Commit transaction
                     conn.commit()
                     
                     # Update progress
+                    imported_rows += len(chunk)
                     pbar.update(len(chunk))
                     
                 except Exception as e:
@@ -180,12 +287,30 @@ def import_data_to_sqlite():
                     del chunk
                     gc.collect()
 
+        print("\nAssigning progressive sample ranks...")
+        assign_sample_ranks(conn)
+        conn.commit()
+
+        print("\nStoring distribution sketches...")
+        store_sketches(conn, sketches)
+        conn.commit()
+        print(f"{len(sketches)} sketches stored")
+
         print("\nCreating indices...")
         conn.execute('CREATE INDEX IF NOT EXISTS idx_pc_coords ON entity_clusters(pc1, pc2, pc3)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_main_cluster ON entity_clusters(cluster)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_sample_rank ON entity_clusters(sample_rank)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_cluster_probs ON entity_clusters(cluster_1, cluster_2, cluster_3, cluster_4, cluster_5, cluster_6, cluster_7, cluster_8, cluster_9, cluster_10, cluster_11, cluster_12)')
-        
-        print("Import completed successfully!")
+
+        conn.commit()
+
+        print("\nWriting columnar snapshot...")
+        n_rows = write_snapshot(conn, snapshot_path)
+        print(f"Columnar snapshot with {n_rows:,} rows written to {snapshot_path}")
+
+        # Readers open the file as immutable and ignore the WAL, so fold it
+        # back into a self-contained database file
+        conn.execute('PRAGMA journal_mode = DELETE')
 
     except Exception as e:
         print(f"\nError occurred: {str(e)}")
@@ -193,10 +318,34 @@ def import_data_to_sqlite():
             conn.rollback()
         except sqlite3.Error:
             pass
+        conn.close()
+        discard_version(db_path, snapshot_path)
         raise
-    finally:
+    else:
         conn.close()
-        print("\nDatabase connection closed")
+    print("\nDatabase connection closed")
+
+    try:
+        verify_database(db_path, snapshot_path, imported_rows, len(sketches))
+    except Exception:
+        discard_version(db_path, snapshot_path)
+        raise
+
+    publish_version(version, db_path, snapshot_path)
+    print(f"Version {version} published")
+    prune_versions()
+    print("Import completed successfully!")
+
+
+def discard_version(db_path, snapshot_path):
+    """Delete an unpublished version"""
+    if Path(db_path).resolve() == current_version()["database"].resolve():
+        print(f"Not discarding {db_path.name}: it is the published version")
+        return
+    print(f"Discarding {db_path.name}")
+    for path in (db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-shm")):
+        path.unlink(missing_ok=True)
+    shutil.rmtree(snapshot_path, ignore_errors=True)
 
 if __name__ == "__main__":
     import_data_to_sqlite()
\ No newline at end of file
@@ -0,0 +1,169 @@
+import argparse
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+MAGIC = b'BTCKIDX1'
+FANOUT_BITS = 16
+FANOUT_SIZE = 1 << FANOUT_BITS
+
+# File layout (little-endian):
+#   header   magic, number of keys
+#   fanout   FANOUT_SIZE + 1 uint64 offsets, fanout[p] is the first key
+#            whose 16-bit prefix is >= p
+#   keys     n sorted 16-byte UUIDs
+#   entities n int64 entity ids, aligned with keys
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('n_keys', '<u8')])
+RECORD_DTYPE = np.dtype([('key', 'S16'), ('entity_id', '<i8')])
+
+# Hex digit -> nibble, for vectorized UUID parsing
+_HEX = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(b'0123456789abcdef'):
+    _HEX[_c] = _i
+    _HEX[bytes([_c]).upper()[0]] = _i
+
+
+def uuids_to_bytes(values):
+    """Convert an array of UUID strings to an array of 16-byte keys"""
+    hex_digits = np.char.replace(np.asarray(values, dtype='U36'), '-', '')
+    raw = np.frombuffer(hex_digits.astype('S32').tobytes(), dtype=np.uint8)
+    nibbles = _HEX[raw].reshape(-1, 32)
+    if (nibbles == 255).any():
+        raise ValueError("Invalid UUID in input")
+    packed = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+    return np.ascontiguousarray(packed).view('S16').ravel()
+
+
+def _key_bytes(keys):
+    """View 16-byte keys as an (n, 16) uint8 array"""
+    return np.ascontiguousarray(keys).view(np.uint8).reshape(-1, 16)
+
+
+def _offsets(n_keys):
+    fanout_offset = HEADER_DTYPE.itemsize
+    keys_offset = fanout_offset + (FANOUT_SIZE + 1) * 8
+    entities_offset = keys_offset + n_keys * 16
+    return fanout_offset, keys_offset, entities_offset
+
+
+def build_key_index(csv_path, index_path, chunk_size=5000000):
+    """Pack a (public_key_uuid, entity_id) CSV into a sorted binary index.
+
+    Records are first sharded by their first byte into 256 temporary
+    files, then every shard is sorted in memory and written at its place,
+    so memory is bounded by the largest shard, not by the number of keys.
+    """
+    index_path = Path(index_path)
+    tmp_dir = Path(tempfile.mkdtemp(dir=index_path.parent))
+    shard_paths = [tmp_dir / f'shard_{i:03d}.bin' for i in range(256)]
+    n_keys = 0
+
+    try:
+        print("Sharding keys...")
+        chunks = pd.read_csv(csv_path, chunksize=chunk_size, dtype=str)
+        for chunk in tqdm(chunks, desc="Reading mapping"):
+            chunk.columns = [col.lower() for col in chunk.columns]
+            records = np.empty(len(chunk), dtype=RECORD_DTYPE)
+            records['key'] = uuids_to_bytes(chunk['public_key_uuid'].to_numpy())
+            records['entity_id'] = chunk['entity_id'].astype(np.int64).to_numpy()
+
+            first_byte = _key_bytes(records['key'])[:, 0]
+            order = np.argsort(first_byte, kind='stable')
+            records, first_byte = records[order], first_byte[order]
+            bounds = np.searchsorted(first_byte, np.arange(257))
+            for shard in np.flatnonzero(np.diff(bounds)):
+                with open(shard_paths[shard], 'ab') as f:
+                    records[bounds[shard]:bounds[shard + 1]].tofile(f)
+            n_keys += len(records)
+
+        print(f"Writing index of {n_keys:,} keys...")
+        fanout_offset, keys_offset, entities_offset = _offsets(n_keys)
+        tmp_index = index_path.with_name(index_path.name + '.tmp')
+        size = entities_offset + n_keys * 8
+        out = np.memmap(tmp_index, dtype=np.uint8, mode='w+', shape=(size,))
+
+        header = np.array([(MAGIC, n_keys)], dtype=HEADER_DTYPE)
+        out[:HEADER_DTYPE.itemsize] = header.view(np.uint8)
+        fanout_counts = np.zeros(FANOUT_SIZE, dtype=np.uint64)
+        keys = out[keys_offset:entities_offset].view('S16')
+        entities = out[entities_offset:].view('<i8')
+
+        start = 0
+        for shard_path in tqdm(shard_paths, desc="Sorting shards"):
+            if not shard_path.exists():
+                continue
+            records = np.fromfile(shard_path, dtype=RECORD_DTYPE)
+            records.sort(order='key', kind='stable')
+            stop = start + len(records)
+            keys[start:stop] = records['key']
+            entities[start:stop] = records['entity_id']
+
+            key_bytes = _key_bytes(records['key'])
+            prefix = (key_bytes[:, 0].astype(np.int64) << 8) | key_bytes[:, 1]
+            fanout_counts += np.bincount(prefix, minlength=FANOUT_SIZE).astype(np.uint64)
+            start = stop
+
+        fanout = np.concatenate(([0], np.cumsum(fanout_counts))).astype('<u8')
+        out[fanout_offset:keys_offset] = fanout.view(np.uint8)
+        out.flush()
+        del out, keys, entities
+        tmp_index.replace(index_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"Index written to {index_path}")
+    return n_keys
+
+
+class KeyIndex:
+    """Memory-mapped public_key_uuid -> entity_id lookup.
+
+    The 16-bit prefix fan-out table narrows every lookup to a small range
+    of the sorted keys, which is then binary-searched.
+    """
+
+    def __init__(self, index_path):
+        self.path = Path(index_path)
+        self.mtime_ns = self.path.stat().st_mtime_ns
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        header = self._data[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f"{self.path} is not a key index")
+        self.n_keys = int(header['n_keys'])
+        fanout_offset, keys_offset, entities_offset = _offsets(self.n_keys)
+        self.fanout = self._data[fanout_offset:keys_offset].view('<u8')
+        self.keys = self._data[keys_offset:entities_offset].view('S16')
+        self.entities = self._data[entities_offset:].view('<i8')
+
+    def lookup(self, public_key_uuid):
+        """Return the entity_id of a UUID, None if it is not indexed"""
+        key = uuid.UUID(str(public_key_uuid)).bytes
+        prefix = (key[0] << 8) | key[1]
+        low, high = int(self.fanout[prefix]), int(self.fanout[prefix + 1])
+        i = low + int(np.searchsorted(self.keys[low:high], key))
+        # NumPy strips trailing null bytes of S16 values
+        if i < high and self.keys[i] == key.rstrip(b'\x00'):
+            return int(self.entities[i])
+        return None
+
+    def lookup_many(self, public_key_uuids):
+        return [self.lookup(key) for key in public_key_uuids]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the public_key_uuid -> entity_id index from the entity mapping CSV"
+    )
+    parser.add_argument("mapping_csv", help="CSV with PUBLIC_KEY_UUID and ENTITY_ID columns")
+    parser.add_argument(
+        "index_path", nargs="?",
+        default=Path(__file__).parent / "public_keys.idx",
+        help="Output index file",
+    )
+    args = parser.parse_args()
+    build_key_index(args.mapping_csv, args.index_path)
@@ -1,8 +1,20 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import base64
+import json
+from typing import List, Optional
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from databases import Database
-import os
-from pathlib import Path
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from columnar import ENTITY_COLUMNS
+from database import (
+    ReadOnlyPool, API_WORKERS, API_BACKEND, KEY_INDEX_PATH, DB_RELOAD_INTERVAL,
+    current_version,
+)
+from export import MEDIA_TYPES, stream_export
+from sketches import DEFAULT_QUANTILES, SKETCH_FEATURES, LogSketch
 
 # Initialize FastAPI app
 app = FastAPI(title="Bitcoin Clustering API")
@@ -16,14 +28,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database URL - using relative path
-DATABASE_URL = f"sqlite:///{Path(__file__).parent}/bitcoin_clusters.db"
-database = Database(DATABASE_URL)
+# Pool of read-only connections shared by all requests of this worker
+database = ReadOnlyPool()
+
+# Memory-mapped columnar snapshot, loaded at startup when API_BACKEND=columnar.
+# Its NumPy work (and the page faults of the first reads) runs on the thread
+# pool, like the SQLite queries, so the event loop never blocks
+store = None
+
+# Memory-mapped public_key_uuid -> entity_id index, loaded if it exists
+key_index = None
+
+MAX_KEY_BATCH = 10000
+
+MAX_STREAM_SAMPLE = 200000
+
+
+class KeyBatch(BaseModel):
+    public_key_uuids: List[str]
+
+def load_store(snapshot_path):
+    from columnar import ColumnarStore
+    return ColumnarStore(snapshot_path)
+
+
+def load_key_index():
+    from key_index import KeyIndex
+    return KeyIndex(KEY_INDEX_PATH)
+
+
+def key_index_changed():
+    """True if the key index file has been (re)built since it was loaded"""
+    if not KEY_INDEX_PATH.exists():
+        return False
+    return key_index is None or KEY_INDEX_PATH.stat().st_mtime_ns != key_index.mtime_ns
+
+
+async def reload_if_changed():
+    """Switch the pool, snapshot and key index to newly published files.
+
+    The new store and index are fully loaded before the globals are
+    replaced, so requests always see a consistent set.
+    """
+    global store, key_index
+    loop = asyncio.get_running_loop()
+
+    current = current_version()
+    if current["version"] != database.version:
+        new_store = None
+        if API_BACKEND == "columnar":
+            new_store = await loop.run_in_executor(None, load_store, current["snapshot"])
+        await database.switch(current["database"], current["version"])
+        store = new_store
+        print(f"Switched to database version {current['version']}: {current['database']}")
+
+    if key_index_changed():
+        key_index = await loop.run_in_executor(None, load_key_index)
+        print(f"Key index reloaded: {KEY_INDEX_PATH} ({key_index.n_keys:,} keys)")
+
+
+async def watch_versions():
+    while True:
+        await asyncio.sleep(DB_RELOAD_INTERVAL)
+        try:
+            await reload_if_changed()
+        except Exception as e:
+            print(f"Reload error: {str(e)}")
+
 
 @app.on_event("startup")
 async def startup():
+    global store, key_index
     await database.connect()
-    print(f"Database path: {Path(__file__).parent}/bitcoin_clusters.db")
+    if KEY_INDEX_PATH.exists():
+        key_index = load_key_index()
+        print(f"Key index: {KEY_INDEX_PATH} ({key_index.n_keys:,} keys)")
+    if API_BACKEND == "columnar":
+        snapshot_path = current_version()["snapshot"]
+        store = load_store(snapshot_path)
+        print(f"Serving from columnar snapshot: {snapshot_path} ({store.rows:,} rows)")
+    print(f"Database path: {database.path} (version {database.version})")
+    print(f"Read-only connections: {database.size}")
+    if DB_RELOAD_INTERVAL > 0:
+        app.state.version_watcher = asyncio.create_task(watch_versions())
     try:
         query = "SELECT * FROM entity_clusters LIMIT 1"
         result = await database.fetch_one(query)
@@ -34,6 +121,9 @@ async def startup():
 
 @app.on_event("shutdown")
 async def shutdown():
+    watcher = getattr(app.state, "version_watcher", None)
+    if watcher is not None:
+        watcher.cancel()
     await database.disconnect()
 
 @app.get("/")
@@ -45,6 +135,9 @@ async def get_cluster_data(sample_size: int = 1000):
     """
     Get sampled cluster data for 3D visualization with all cluster probabilities
     """
+    if store is not None:
+        return await run_in_threadpool(store.sample, min(sample_size, 25000))
+
     query = """
     SELECT 
         entity_id,
@@ -70,11 +163,109 @@ async def get_cluster_data(sample_size: int = 1000):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+PROGRESSIVE_QUERY = f"""
+SELECT {', '.join(ENTITY_COLUMNS)}, sample_rank
+FROM entity_clusters
+WHERE (sample_rank, entity_id) > (:after_rank, :after_id)
+ORDER BY sample_rank, entity_id
+LIMIT :size
+"""
+
+async def fetch_progressive(position, size):
+    """Next `size` rows of the progressive sample after `position`, from the
+    start if None, and the position after them: a row offset (columnar) or
+    a (sample_rank, entity_id) key (SQLite), never sent with the rows"""
+    if store is not None:
+        start = position or 0
+        rows = await run_in_threadpool(store.progressive, start, size)
+        return rows, start + len(rows)
+    after_rank, after_id = position or (-1.0, -1)
+    data = await database.fetch_all(
+        query=PROGRESSIVE_QUERY,
+        values={"after_rank": after_rank, "after_id": after_id, "size": size},
+    )
+    rows = [dict(row) for row in data]
+    if rows:
+        position = (rows[-1]["sample_rank"], rows[-1]["entity_id"])
+    for row in rows:
+        del row["sample_rank"]
+    return rows, position
+
+def encode_cursor(sent, position):
+    """Opaque cursor of the stream: points sent and position of the last one"""
+    return base64.urlsafe_b64encode(json.dumps([sent, position]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        sent, position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(sent), position
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid stream cursor")
+
+def sse_event(event, data, event_id=None):
+    id_line = "" if event_id is None else f"id: {event_id}\n"
+    return f"event: {event}\n{id_line}data: {json.dumps(data)}\n\n"
+
+@app.get("/api/cluster-data/stream")
+async def stream_cluster_data(
+    sample_size: int = 25000,
+    first_batch: int = 1000,
+    batch_size: int = 5000,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Stream a sample for 3D visualization as server-sent events, coarse to fine.
+
+    Rows are read by increasing sample_rank, a random rank within each
+    cluster, so every batch refines a sample stratified by cluster. The
+    first batch is small to draw quickly; the client can close the stream
+    once it has enough points. The id of every batch is an opaque cursor,
+    which EventSource sends back as Last-Event-ID to resume after a
+    dropped connection.
+    """
+    sample_size = min(max(sample_size, 0), MAX_STREAM_SAMPLE)
+    first_batch = max(first_batch, 1)
+    batch_size = max(batch_size, 1)
+    sent, position = (0, None) if last_event_id is None else decode_cursor(last_event_id)
+    size = min(first_batch if sent == 0 else batch_size, sample_size - sent)
+
+    try:
+        first = await fetch_progressive(position, size) if size > 0 else ([], position)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    async def events():
+        nonlocal sent
+        rows, position = first
+        while rows:
+            sent += len(rows)
+            yield sse_event("points", rows, encode_cursor(sent, position))
+            if sent >= sample_size:
+                break
+            try:
+                rows, position = await fetch_progressive(position, min(batch_size, sample_size - sent))
+            except Exception as e:
+                yield sse_event("error", {"detail": f"Database error: {str(e)}"})
+                return
+        yield sse_event("done", {"count": sent})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
 @app.get("/api/entity/{entity_id}")
 async def get_entity(entity_id: int):
     """
     Get details for a specific entity including cluster probabilities
     """
+    if store is not None:
+        result = await run_in_threadpool(store.entity, entity_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Entity not found")
+        return result
+
     query = """
     SELECT 
         entity_id,
@@ -100,11 +291,83 @@ async def get_entity(entity_id: int):
         
     return dict(result)
 
+async def get_entity_profiles(entity_ids):
+    """Profiles of the given entities, keyed by entity_id"""
+    entity_ids = sorted(set(entity_ids))
+    if not entity_ids:
+        return {}
+    if store is not None:
+        entity = store.entity
+        profiles = await run_in_threadpool(lambda: [entity(entity_id) for entity_id in entity_ids])
+        return {p["entity_id"]: p for p in profiles if p is not None}
+
+    placeholders = ", ".join(f":id{i}" for i in range(len(entity_ids)))
+    query = f"""
+    SELECT {', '.join(ENTITY_COLUMNS)}
+    FROM entity_clusters
+    WHERE entity_id IN ({placeholders})
+    """
+    rows = await database.fetch_all(
+        query=query,
+        values={f"id{i}": entity_id for i, entity_id in enumerate(entity_ids)},
+    )
+    return {row["entity_id"]: dict(row) for row in rows}
+
+async def lookup_keys(public_key_uuids):
+    if key_index is None:
+        raise HTTPException(status_code=503, detail="Key index is not available")
+    # Up to MAX_KEY_BATCH binary searches, kept off the event loop
+    try:
+        return await run_in_threadpool(key_index.lookup_many, public_key_uuids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid public_key_uuid: {str(e)}")
+
+@app.get("/api/key/{public_key_uuid}")
+async def get_key(public_key_uuid: str):
+    """
+    Resolve a public key UUID to its entity and cluster profile
+    """
+    entity_id = (await lookup_keys([public_key_uuid]))[0]
+    if entity_id is None:
+        raise HTTPException(status_code=404, detail="Public key not found")
+
+    profiles = await get_entity_profiles([entity_id])
+    return {
+        "public_key_uuid": public_key_uuid,
+        "entity_id": entity_id,
+        "entity": profiles.get(entity_id),
+    }
+
+@app.post("/api/keys")
+async def get_keys(batch: KeyBatch):
+    """
+    Resolve a batch of public key UUIDs to their entities and cluster profiles
+    """
+    if len(batch.public_key_uuids) > MAX_KEY_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_KEY_BATCH} keys per request"
+        )
+
+    entity_ids = await lookup_keys(batch.public_key_uuids)
+    profiles = await get_entity_profiles(e for e in entity_ids if e is not None)
+    return [
+        {
+            "public_key_uuid": public_key_uuid,
+            "entity_id": entity_id,
+            "entity": profiles.get(entity_id),
+        }
+        for public_key_uuid, entity_id in zip(batch.public_key_uuids, entity_ids)
+    ]
+
 @app.get("/api/cluster-stats")
 async def get_cluster_stats():
     """
     Get comprehensive statistics about cluster distribution
     """
+    if store is not None:
+        return await run_in_threadpool(store.cluster_stats)
+
     query = """
     SELECT 
         cluster,
@@ -138,6 +401,9 @@ async def get_cluster_entities(
     """
     Get entities belonging to a specific cluster with pagination
     """
+    if store is not None:
+        return await run_in_threadpool(store.cluster_entities, cluster_id, limit, offset)
+
     query = """
     SELECT 
         entity_id,
@@ -169,11 +435,100 @@ async def get_cluster_entities(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@app.get("/api/cluster/{cluster_id}/distribution")
+async def get_cluster_distribution(
+    cluster_id: int,
+    feature: Optional[str] = None,
+    bins: int = 30,
+):
+    """
+    Get quantiles and log-scale histograms of the features of a cluster,
+    served from the sketches built at import time
+    """
+    if feature is not None and feature not in SKETCH_FEATURES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown feature '{feature}', use one of {SKETCH_FEATURES}"
+        )
+
+    query = """
+    SELECT feature, sketch
+    FROM cluster_distributions
+    WHERE cluster = :cluster_id
+    """
+    try:
+        rows = await database.fetch_all(query=query, values={"cluster_id": cluster_id})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="Cluster not found")
+
+    return {
+        "cluster": cluster_id,
+        "features": {
+            row["feature"]: LogSketch.from_json(row["sketch"]).summary(
+                DEFAULT_QUANTILES, max(1, min(bins, 200))
+            )
+            for row in rows
+            if feature is None or row["feature"] == feature
+        },
+    }
+
+@app.get("/api/export")
+async def export_entities(
+    format: str = "ndjson",
+    cluster_id: Optional[int] = None,
+    min_btc_received: Optional[float] = None,
+    max_btc_received: Optional[float] = None,
+    chunk_size: int = 10000,
+):
+    """
+    Stream all entities matching the filters as NDJSON, CSV or Parquet
+    """
+    if format not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format '{format}', use one of {list(MEDIA_TYPES)}"
+        )
+
+    filters = {
+        "cluster = :cluster_id": cluster_id,
+        "total_btc_received >= :min_btc_received": min_btc_received,
+        "total_btc_received <= :max_btc_received": max_btc_received,
+    }
+    where = [condition for condition, value in filters.items() if value is not None]
+    query = f"SELECT {', '.join(ENTITY_COLUMNS)} FROM entity_clusters"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    values = {
+        "cluster_id": cluster_id,
+        "min_btc_received": min_btc_received,
+        "max_btc_received": max_btc_received,
+    }
+
+    filename = f"entities_cluster_{cluster_id}" if cluster_id is not None else "entities"
+    return StreamingResponse(
+        stream_export(database.path, query, values, format, max(1, min(chunk_size, 100000))),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
+
+@app.get("/api/cluster/{cluster_id}/export")
+async def export_cluster(cluster_id: int, format: str = "ndjson"):
+    """
+    Stream every entity of a cluster as NDJSON, CSV or Parquet
+    """
+    return await export_entities(format=format, cluster_id=cluster_id)
+
 @app.get("/api/visualization-stats")
 async def get_visualization_stats():
     """
     Get statistics needed for visualization scaling and coloring
     """
+    if store is not None:
+        return await run_in_threadpool(store.visualization_stats)
+
     query = """
     SELECT 
         MIN(pc1) as min_pc1,
@@ -196,7 +551,7 @@ async def get_visualization_stats():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
+    uvicorn.run("main:app", host="127.0.0.1", port=8000, workers=API_WORKERS)
 
 
     
\ No newline at end of file
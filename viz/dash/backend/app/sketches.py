@@ -0,0 +1,176 @@
+import json
+import math
+
+import numpy as np
+
+# Features sketched per cluster at import time
+SKETCH_FEATURES = [
+    'total_receive_addresses',
+    'total_receive_transactions',
+    'total_btc_received',
+    'total_spend_addresses',
+    'total_spend_transactions',
+    'total_btc_spent',
+]
+
+DEFAULT_QUANTILES = [0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+
+
+class LogSketch:
+    """Mergeable quantile sketch over logarithmic buckets (DDSketch-style).
+
+    Positive values are counted in buckets i = ceil(log_gamma(x)) with
+    gamma = (1 + alpha) / (1 - alpha), so every quantile is returned with a
+    relative error of at most `alpha`. Values <= 0 are counted apart. Two
+    sketches with the same alpha merge exactly by adding bucket counts,
+    and the buckets double as a log-scale histogram.
+    """
+
+    def __init__(self, alpha=0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.count += int(values.size)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        positive = values[values > 0]
+        self.zero_count += int(values.size - positive.size)
+        index, counts = np.unique(
+            np.ceil(np.log(positive) / self._log_gamma).astype(np.int64),
+            return_counts=True,
+        )
+        for i, c in zip(index.tolist(), counts.tolist()):
+            self.bins[i] = self.bins.get(i, 0) + c
+        return self
+
+    def merge(self, other):
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge sketches with different alpha")
+        for i, c in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return min(self.min, 0.0)
+        cumulative = self.zero_count
+        for index in sorted(self.bins):
+            cumulative += self.bins[index]
+            if cumulative > rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def histogram(self, n_bins=30):
+        """Counts over `n_bins` log-spaced bins between the positive min and max"""
+        positive = sorted(self.bins)
+        if not positive:
+            return {'edges': [], 'counts': [], 'zero_count': self.zero_count}
+        low = self.gamma ** (positive[0] - 1)
+        high = self.gamma ** positive[-1]
+        edges = np.geomspace(low, high, n_bins + 1)
+        values = np.array([self._value(i) for i in positive])
+        weights = np.array([self.bins[i] for i in positive])
+        counts, _ = np.histogram(values, bins=edges, weights=weights)
+        return {
+            'edges': edges.tolist(),
+            'counts': counts.astype(np.int64).tolist(),
+            'zero_count': self.zero_count,
+        }
+
+    def to_json(self):
+        return json.dumps({
+            'alpha': self.alpha,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'zero_count': self.zero_count,
+            'bins': self.bins,
+        })
+
+    @classmethod
+    def from_json(cls, payload):
+        data = json.loads(payload)
+        sketch = cls(data['alpha'])
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        sketch.min = math.inf if data['min'] is None else data['min']
+        sketch.max = -math.inf if data['max'] is None else data['max']
+        sketch.zero_count = data['zero_count']
+        sketch.bins = {int(i): c for i, c in data['bins'].items()}
+        return sketch
+
+    def summary(self, quantiles=DEFAULT_QUANTILES, n_bins=30):
+        return {
+            'count': self.count,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'mean': self.sum / self.count if self.count else None,
+            'quantiles': {str(q): self.quantile(q) for q in quantiles},
+            'histogram': self.histogram(n_bins),
+        }
+
+
+def sketch_chunk(sketches, chunk, alpha=0.01):
+    """Add a DataFrame chunk to the {(cluster, feature): LogSketch} dict"""
+    for cluster, group in chunk.groupby('cluster'):
+        for feature in SKETCH_FEATURES:
+            key = (int(cluster), feature)
+            if key not in sketches:
+                sketches[key] = LogSketch(alpha)
+            sketches[key].add(group[feature].to_numpy())
+    return sketches
+
+
+def create_sketch_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS cluster_distributions (
+        cluster INTEGER,
+        feature TEXT,
+        sketch TEXT,
+        PRIMARY KEY (cluster, feature)
+    )
+    ''')
+
+
+def store_sketches(conn, sketches, merge=False):
+    """Save sketches, merging them into the stored ones if `merge` is set,
+    so incremental imports do not need to rescan previous data"""
+    create_sketch_table(conn)
+    for (cluster, feature), sketch in sketches.items():
+        if merge:
+            row = conn.execute(
+                'SELECT sketch FROM cluster_distributions WHERE cluster = ? AND feature = ?',
+                (cluster, feature),
+            ).fetchone()
+            if row is not None:
+                sketch = LogSketch.from_json(row[0]).merge(sketch)
+        conn.execute(
+            'INSERT OR REPLACE INTO cluster_distributions (cluster, feature, sketch) VALUES (?, ?, ?)',
+            (cluster, feature, sketch.to_json()),
+        )
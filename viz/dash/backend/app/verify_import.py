@@ -1,90 +1,324 @@
+import argparse
+import os
 import sqlite3
-import pandas as pd
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import os
 
-def verify_database():
-    # Setup paths
-    current_file = Path(__file__)
-    app_dir = current_file.parent
-    project_root = app_dir.parent
-    data_dir = project_root / "data"
-    db_path = app_dir / "bitcoin_clusters.db"
-    csv_path = data_dir / "dataset_pca_cluster.csv"
+import numpy as np
+import pandas as pd
+
+from database import current_version
+
+APP_DIR = Path(__file__).parent
+CSV_PATH = APP_DIR.parent / "data" / "dataset_pca_clusters_sample.csv"
+
+TABLE = "entity_clusters"
+KEY = "entity_id"
+# Columns computed by import_data.py, not read from the CSV
+DERIVED_COLUMNS = {"sample_rank"}
+
+# Rows are hashed as float64 bit patterns: every column of entity_clusters
+# is INTEGER or REAL, and the integers are well below 2**53
+_NAN_BITS = np.array([np.nan]).view(np.uint64)[0]
+_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(h):
+    """splitmix64 finalizer, wrapping modulo 2**64"""
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def row_hashes(values):
+    """Hash every row of a float64 matrix to 64 bits"""
+    values = values + 0.0  # -0.0 -> 0.0
+    bits = values.view(np.uint64)
+    bits[np.isnan(values)] = _NAN_BITS
+    hashes = np.zeros(len(values), dtype=np.uint64)
+    for j in range(values.shape[1]):
+        hashes = _mix(hashes * _MULTIPLIER + bits[:, j])
+    return hashes
+
+
+def normalize_column(name):
+    """CSV header -> database column, as in import_data.py"""
+    return name.lower().replace('recieve', 'receive')
+
+
+class ChunkStats:
+    """Row count, null counts, min, max and checksum of every chunk of a table.
+
+    Chunk k holds the rows whose entity_id is in [k * width, (k + 1) * width),
+    so a row lands in the same chunk whatever the order it is read in, and
+    the checksum, the sum of the row hashes modulo 2**64, does not depend on
+    the order either. Both sides of an import can then be streamed in their
+    natural order and compared chunk by chunk.
+    """
+
+    def __init__(self, columns, width):
+        self.columns = list(columns)
+        self.width = width
+        self.invalid_keys = 0
+        n_cols = len(self.columns)
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.nulls = np.zeros((0, n_cols), dtype=np.int64)
+        self.min = np.zeros((0, n_cols))
+        self.max = np.zeros((0, n_cols))
+        self.checksum = np.zeros(0, dtype=np.uint64)
+
+    @property
+    def n_chunks(self):
+        return len(self.rows)
+
+    @property
+    def total_rows(self):
+        return int(self.rows.sum()) + self.invalid_keys
+
+    def resize(self, n_chunks):
+        """Grow the arrays to hold at least n_chunks chunks"""
+        extra = n_chunks - self.n_chunks
+        if extra <= 0:
+            return
+        n_cols = len(self.columns)
+        self.rows = np.concatenate([self.rows, np.zeros(extra, dtype=np.int64)])
+        self.nulls = np.concatenate([self.nulls, np.zeros((extra, n_cols), dtype=np.int64)])
+        self.min = np.concatenate([self.min, np.full((extra, n_cols), np.nan)])
+        self.max = np.concatenate([self.max, np.full((extra, n_cols), np.nan)])
+        self.checksum = np.concatenate([self.checksum, np.zeros(extra, dtype=np.uint64)])
+
+    def update(self, values):
+        """Add rows, a float64 matrix whose first column is the entity_id"""
+        keys = values[:, 0]
+        valid = keys >= 0  # False for NULL ids too
+        if not valid.all():
+            self.invalid_keys += int((~valid).sum())
+            values, keys = values[valid], keys[valid]
+        if not len(values):
+            return
+
+        chunks = (keys // self.width).astype(np.int64)
+        order = np.argsort(chunks, kind='stable')
+        chunks, values = chunks[order], values[order]
+        starts = np.flatnonzero(np.r_[True, chunks[1:] != chunks[:-1]])
+        ids = chunks[starts]
+        self.resize(int(ids[-1]) + 1)
+
+        # ids are unique, so the fancy-indexed updates below do not collide
+        self.rows[ids] += np.diff(np.r_[starts, len(values)])
+        self.nulls[ids] += np.add.reduceat(np.isnan(values).astype(np.int64), starts)
+        self.min[ids] = np.fmin(self.min[ids], np.fmin.reduceat(values, starts))
+        self.max[ids] = np.fmax(self.max[ids], np.fmax.reduceat(values, starts))
+        self.checksum[ids] += np.add.reduceat(row_hashes(values), starts)
+
+    def merge(self, other):
+        """Add the statistics of other rows, e.g. of another entity_id range"""
+        n_chunks = other.n_chunks
+        self.resize(n_chunks)
+        self.invalid_keys += other.invalid_keys
+        self.rows[:n_chunks] += other.rows
+        self.nulls[:n_chunks] += other.nulls
+        self.min[:n_chunks] = np.fmin(self.min[:n_chunks], other.min)
+        self.max[:n_chunks] = np.fmax(self.max[:n_chunks], other.max)
+        self.checksum[:n_chunks] += other.checksum
+
+
+def csv_stats(csv_path, columns, width, chunk_size):
+    """Stream the CSV once into chunk statistics"""
+    # Read with the options of import_data.py: the same separator sniffing
+    # and skipped bad lines, and the same float conversion, so the hashes of
+    # unchanged rows match bit for bit (round_trip parsing does not)
+    options = dict(sep=None, engine='python', on_bad_lines='warn')
+    header = pd.read_csv(csv_path, nrows=0, **options).columns
+    names = {normalize_column(col): col for col in header}
+    usecols = [names[col] for col in columns]
+    stats = ChunkStats(columns, width)
+    chunks = pd.read_csv(
+        csv_path,
+        usecols=usecols,
+        dtype={col: np.float64 for col in usecols},
+        chunksize=chunk_size,
+        **options,
+    )
+    for chunk in chunks:
+        stats.update(chunk[usecols].to_numpy(dtype=np.float64))
+    return stats
 
-    print("\n=== Database Verification Report ===")
 
-    # Connect to database
-    conn = sqlite3.connect(str(db_path))
-    
+def key_ranges(db_path, width, n_ranges):
+    """Split the entity ids of the table into ranges of whole chunks.
+
+    The first and last ranges are open (None), so no row is left out.
+    """
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        low, high = conn.execute(f"SELECT MIN({KEY}), MAX({KEY}) FROM {TABLE}").fetchone()
+    finally:
+        conn.close()
+    if low is None:
+        return [(None, None)]
+    bounds = np.unique(np.linspace(low // width, high // width + 1, n_ranges + 1).round())
+    bounds = [int(bound) * width for bound in bounds]
+    bounds[0], bounds[-1] = None, None
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def table_stats(db_path, columns, width, chunk_size, first_id=None, end_id=None):
+    """Stream the rows with first_id <= entity_id < end_id (all by default),
+    in entity_id (rowid) order, into chunk statistics.
+
+    Also returns the largest deviation from 1 of the sum of the cluster
+    probabilities of a row.
+    """
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    stats = ChunkStats(columns, width)
+    proba = [i for i, col in enumerate(columns) if col.startswith('cluster_')]
+    max_deviation = 0.0
+    conditions, values = [], []
+    if first_id is not None:
+        conditions.append(f"{KEY} >= ?")
+        values.append(first_id)
+    if end_id is not None:
+        conditions.append(f"{KEY} < ?")
+        values.append(end_id)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    try:
+        cursor = conn.execute(
+            f"SELECT {', '.join(columns)} FROM {TABLE}{where} ORDER BY {KEY}", values
+        )
+        while rows := cursor.fetchmany(chunk_size):
+            values = np.array(rows, dtype=np.float64)
+            stats.update(values)
+            if proba:
+                deviation = np.abs(values[:, proba].sum(axis=1) - 1)
+                max_deviation = max(max_deviation, float(np.nanmax(deviation, initial=0)))
+    finally:
+        conn.close()
+    return stats, max_deviation
+
+
+def compare_stats(expected, actual):
+    """List the differences of every chunk as (first id, end id, messages)"""
+    n_chunks = max(expected.n_chunks, actual.n_chunks)
+    expected.resize(n_chunks)
+    actual.resize(n_chunks)
+    columns = np.array(expected.columns)
+
+    def same(a, b):
+        return (a == b) | (np.isnan(a) & np.isnan(b))
+
+    differences = []
+    for k in range(n_chunks):
+        messages = []
+        if expected.rows[k] != actual.rows[k]:
+            messages.append(f"rows {expected.rows[k]:,} vs {actual.rows[k]:,}")
+        for col in columns[expected.nulls[k] != actual.nulls[k]]:
+            j = expected.columns.index(col)
+            messages.append(f"{col} nulls {expected.nulls[k, j]:,} vs {actual.nulls[k, j]:,}")
+        for name, a, b in (("min", expected.min[k], actual.min[k]), ("max", expected.max[k], actual.max[k])):
+            for j in np.flatnonzero(~same(a, b)):
+                messages.append(f"{columns[j]} {name} {float(a[j])!r} vs {float(b[j])!r}")
+        if not messages and expected.checksum[k] != actual.checksum[k]:
+            messages.append("checksum (same counts and ranges, different values)")
+        if messages:
+            width = expected.width
+            differences.append((k * width, (k + 1) * width, messages))
+    return differences
+
+
+def verify_import(csv_path=CSV_PATH, db_path=None, width=65536, chunk_size=100000,
+                  max_report=20, workers=None):
+    """Compare the imported table with the CSV in a single pass over each.
+
+    Returns True if every chunk matches.
+    """
+    db_path = Path(db_path or current_version()["database"])
+    csv_path = Path(csv_path)
+    print("\n=== Import Verification Report ===")
+    print(f"CSV:      {csv_path}")
+    print(f"Database: {db_path}")
+
+    conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
     try:
-        # 1. Check total number of rows
-        row_count = pd.read_sql("SELECT COUNT(*) as count FROM entity_clusters", conn).iloc[0]['count']
-        print(f"\n1. Total rows in database: {row_count:,}")
-
-        # 2. Check column names and types
-        schema = pd.read_sql("PRAGMA table_info(entity_clusters)", conn)
-        print(f"\n2. Column Information:")
-        print(schema[['name', 'type']])
-
-        # 3. Sample data verification
-        print("\n3. Sample Data (first 5 rows):")
-        sample = pd.read_sql("SELECT * FROM entity_clusters LIMIT 5", conn)
-        print(sample)
-
-        # 4. Check for null values
-        null_counts = pd.read_sql("""
-            SELECT 
-                SUM(CASE WHEN entity_id IS NULL THEN 1 ELSE 0 END) as null_entity_ids,
-                SUM(CASE WHEN pc1 IS NULL THEN 1 ELSE 0 END) as null_pc1,
-                SUM(CASE WHEN pc2 IS NULL THEN 1 ELSE 0 END) as null_pc2,
-                SUM(CASE WHEN pc3 IS NULL THEN 1 ELSE 0 END) as null_pc3
-            FROM entity_clusters
-        """, conn)
-        print("\n4. Null Value Counts:")
-        print(null_counts)
-
-        # 5. Check value ranges
-        ranges = pd.read_sql("""
-            SELECT 
-                MIN(entity_id) as min_entity_id,
-                MAX(entity_id) as max_entity_id,
-                MIN(pc1) as min_pc1,
-                MAX(pc1) as max_pc1,
-                MIN(pc2) as min_pc2,
-                MAX(pc2) as max_pc2,
-                MIN(pc3) as min_pc3,
-                MAX(pc3) as max_pc3
-            FROM entity_clusters
-        """, conn)
-        print("\n5. Value Ranges:")
-        print(ranges)
-
-        # 6. Verify clusters sum to approximately 1
-        cluster_sums = pd.read_sql("""
-            SELECT 
-                AVG(cluster_1 + cluster_2 + cluster_3 + cluster_4 + cluster_5 +
-                    cluster_6 + cluster_7 + cluster_8 + cluster_9 + cluster_10 +
-                    cluster_11 + cluster_12 + cluster_13 + cluster_14 + cluster_15 +
-                    cluster_16 + cluster_17 + cluster_18 + cluster_19 + cluster_20 +
-                    cluster_21 + cluster_22 + cluster_23 + cluster_24 + cluster_25 +
-                    cluster_26 + cluster_27) as avg_cluster_sum
-            FROM entity_clusters
-        """, conn)
-        print("\n6. Average Cluster Probability Sum:")
-        print(cluster_sums)
-
-        # 7. Compare with original CSV file
-        csv_row_count = sum(1 for _ in open(csv_path)) - 1  # subtract 1 for header
-        print(f"\n7. CSV Comparison:")
-        print(f"Rows in CSV: {csv_row_count:,}")
-        print(f"Rows in Database: {row_count:,}")
-        print(f"Match: {'Yes' if csv_row_count == row_count else 'No'}")
-
-    except Exception as e:
-        print(f"Error during verification: {str(e)}")
+        table_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")]
     finally:
         conn.close()
+    csv_columns = [normalize_column(col) for col in pd.read_csv(csv_path, nrows=0).columns]
+
+    ok = True
+    table_only = [col for col in table_columns if col not in csv_columns and col not in DERIVED_COLUMNS]
+    csv_only = [col for col in csv_columns if col not in table_columns]
+    if table_only or csv_only:
+        ok = False
+        print(f"\nColumns only in the table: {table_only or '-'}")
+        print(f"Columns only in the CSV:   {csv_only or '-'}")
+    if KEY not in table_columns or KEY not in csv_columns:
+        print(f"\n{KEY} is missing, chunks cannot be matched")
+        return False
+
+    # entity_id first: it assigns rows to chunks
+    columns = [KEY] + [col for col in table_columns if col in csv_columns and col != KEY]
+
+    start = time.perf_counter()
+    # Building Python rows dominates reading the table, so worker processes
+    # scan disjoint entity_id ranges while this one parses the CSV, and the
+    # check takes about as long as reading the CSV once
+    workers = workers or os.cpu_count() or 1
+    ranges = key_ranges(db_path, width, workers)
+    db = ChunkStats(columns, width)
+    max_deviation = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(table_stats, db_path, columns, width, chunk_size, first_id, end_id)
+            for first_id, end_id in ranges
+        ]
+        csv = csv_stats(csv_path, columns, width, chunk_size)
+        for future in futures:
+            stats, deviation = future.result()
+            db.merge(stats)
+            max_deviation = max(max_deviation, deviation)
+    elapsed = time.perf_counter() - start
+
+    print(f"\nRows in CSV:      {csv.total_rows:,}")
+    print(f"Rows in database: {db.total_rows:,}")
+    print(f"Columns compared: {len(columns)}")
+    print(f"Chunks of {width:,} entity ids: {max(csv.n_chunks, db.n_chunks):,}")
+    print(f"Max deviation of the cluster probability sums from 1: {max_deviation:.2e}")
+    print(f"Both sides read in {elapsed:.1f}s")
+
+    if csv.invalid_keys or db.invalid_keys:
+        ok = False
+        print(f"\nRows without a valid {KEY}: {csv.invalid_keys:,} in the CSV, {db.invalid_keys:,} in the database")
+
+    differences = compare_stats(csv, db)
+    if differences:
+        ok = False
+        print(f"\n{len(differences):,} chunks differ (CSV vs database):")
+        for first, end, messages in differences[:max_report]:
+            print(f"  {KEY} [{first:,}, {end:,}): {'; '.join(messages)}")
+        if len(differences) > max_report:
+            print(f"  ... and {len(differences) - max_report:,} more")
+
+    print(f"\nMatch: {'Yes' if ok else 'No'}")
+    return ok
+
 
 if __name__ == "__main__":
-    verify_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Verify the imported database against the CSV, chunk by chunk"
+    )
+    parser.add_argument("csv_path", nargs="?", default=CSV_PATH, help="Imported CSV")
+    parser.add_argument("--db", help="Database file, the published version by default")
+    parser.add_argument("--width", type=int, default=65536, help="Entity ids per chunk")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows read at once")
+    parser.add_argument("--max-report", type=int, default=20, help="Differing chunks printed")
+    parser.add_argument("--workers", type=int, help="Processes reading the table, all cores by default")
+    args = parser.parse_args()
+    ok = verify_import(
+        args.csv_path, args.db, args.width, args.chunk_size, args.max_report, args.workers
+    )
+    sys.exit(0 if ok else 1)
@@ -146,19 +146,82 @@ const Clustering3D = () => {
 
 
 
-  const fetchData = async () => {
-    try {
-      setLoading(true);
-      const response = await fetch(`http://localhost:8000/api/cluster-data?sample_size=${sampleSize}`);
-      if (!response.ok) throw new Error('Failed to fetch data');
-      const jsonData = await response.json();
-      setData(jsonData);
-      setError(null);
-    } catch (err) {
-      setError(err.message);
-    } finally {
-      setLoading(false);
+  // First batch of the progressive stream, kept small so points show up quickly
+  const FIRST_BATCH = 1000;
+  const BATCH_SIZE = 5000;
+  // Batches are buffered and appended to data at most every FLUSH_INTERVAL ms,
+  // so a long stream does not copy the whole array (and rebuild the point
+  // buffers) once per batch
+  const FLUSH_INTERVAL = 250;
+  const streamRef = useRef(null);
+  const pendingRef = useRef([]);
+  const flushTimerRef = useRef(null);
+  const [streaming, setStreaming] = useState(false);
+
+  const flushPending = () => {
+    clearTimeout(flushTimerRef.current);
+    flushTimerRef.current = null;
+    const chunks = pendingRef.current;
+    if (chunks.length === 0) return;
+    pendingRef.current = [];
+    setData(prev => prev.concat(...chunks));
+    setLoading(false);
+  };
+
+  // Drops batches not flushed yet, flush first to keep them
+  const closeStream = () => {
+    if (streamRef.current) {
+      streamRef.current.close();
+      streamRef.current = null;
     }
+    clearTimeout(flushTimerRef.current);
+    flushTimerRef.current = null;
+    pendingRef.current = [];
+    setStreaming(false);
+  };
+
+  const fetchData = () => {
+    closeStream();
+    setLoading(true);
+    setData([]);
+    setError(null);
+    setStreaming(true);
+
+    let received = 0;
+    const source = new EventSource(
+      `http://localhost:8000/api/cluster-data/stream?sample_size=${sampleSize}` +
+      `&first_batch=${Math.min(FIRST_BATCH, sampleSize)}&batch_size=${BATCH_SIZE}`
+    );
+    streamRef.current = source;
+
+    // Coarse sample first (shown right away), then refinement batches
+    source.addEventListener('points', (event) => {
+      const batch = JSON.parse(event.data);
+      const first = received === 0;
+      received += batch.length;
+      pendingRef.current.push(batch);
+      if (first || received >= sampleSize) {
+        flushPending();
+        if (received >= sampleSize) closeStream();
+      } else if (flushTimerRef.current === null) {
+        flushTimerRef.current = setTimeout(flushPending, FLUSH_INTERVAL);
+      }
+    });
+
+    source.addEventListener('done', () => {
+      flushPending();
+      closeStream();
+      setLoading(false);
+    });
+
+    // Server-sent error events carry a detail, connection errors do not
+    source.addEventListener('error', (event) => {
+      if (streamRef.current !== source) return;
+      flushPending();
+      setError(event.data ? JSON.parse(event.data).detail : 'Failed to fetch data');
+      closeStream();
+      setLoading(false);
+    });
   };
 
   const searchEntity = async () => {
@@ -183,6 +246,7 @@ const Clustering3D = () => {
 
   useEffect(() => {
     fetchData();
+    return closeStream;
   }, [sampleSize]);
 
   if (loading) {
@@ -260,6 +324,11 @@ const Clustering3D = () => {
             </button>
           </div>
           <small>Adjust the number of data points to visualize.</small>
+          {streaming && (
+            <small className="stream-progress">
+              Loading {data.length.toLocaleString()} / {sampleSize.toLocaleString()} points...
+            </small>
+          )}
         </div>
         
         {error && (
@@ -472,6 +541,11 @@ const Clustering3D = () => {
           font-size: 0.8rem;
         }
 
+        .stream-progress {
+          display: block;
+          margin-top: 4px;
+        }
+
         .error-message {
           color: #ff4444;
           font-size: 0.9rem;